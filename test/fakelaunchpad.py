@@ -0,0 +1,431 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+'''In memory stand-in for the parts of launchpadlib unify is using
+
+Objects are shared: loading the same link twice gives the same object and
+changes are visible right away. Every call which would be an HTTP request
+on the real service is counted in FakeLaunchpad.calls.'''
+
+import collections
+import datetime
+import json
+import lazr.restfulclient.errors
+import os
+import threading
+
+api_root = 'https://api.launchpad.net/1.0/'
+web_root = 'https://bugs.launchpad.net/'
+open_statuses = ("New", "Incomplete", "Confirmed", "Triaged", "In Progress", "Fix Committed")
+
+default_fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'launchpad.json')
+
+def load_fixture(fixture_path=default_fixture):
+    '''Create a FakeLaunchpad populated from a json fixture'''
+    with open(fixture_path) as f:
+        return FakeLaunchpad(json.load(f))
+
+
+class FakeEntry(object):
+
+    def __init__(self, launchpad, self_link):
+        self.launchpad = launchpad
+        self.self_link = self_link
+        launchpad.entries[self_link] = self
+
+    def lp_save(self):
+        self.launchpad.count('save')
+
+
+class FakePerson(FakeEntry):
+
+    def __init__(self, launchpad, name):
+        FakeEntry.__init__(self, launchpad, '%s~%s' % (api_root, name))
+        self.name = name
+
+
+class FakeBugTracker(FakeEntry):
+
+    def __init__(self, launchpad, name):
+        FakeEntry.__init__(self, launchpad, '%sbugs/bugtrackers/%s' % (api_root, name))
+        self.name = name
+
+
+class FakeBugWatch(FakeEntry):
+
+    def __init__(self, launchpad, bug, bug_tracker, remote_bug):
+        FakeEntry.__init__(self, launchpad, '%s/+watch/%s' % (bug.self_link, launchpad.next_id()))
+        self.bug_tracker = bug_tracker
+        self.remote_bug = remote_bug
+
+
+class FakeMilestone(FakeEntry):
+
+    def __init__(self, launchpad, project, name, date_targeted=None):
+        FakeEntry.__init__(self, launchpad, '%s%s/+milestone/%s' % (api_root, project.name, name))
+        self.project = project
+        self.name = name
+        self.date_targeted = date_targeted
+        self.is_active = True
+
+    def searchTasks(self, **kwargs):
+        return self.launchpad.search_tasks(lambda task: task.milestone is self, **kwargs)
+
+
+class FakeTarget(FakeEntry):
+    '''Something we can open a bug task on'''
+
+    def __init__(self, launchpad, self_link, bug_target_name, path):
+        FakeEntry.__init__(self, launchpad, self_link)
+        self.bug_target_name = bug_target_name
+        self.path = path
+
+    def searchTasks(self, **kwargs):
+        return self.launchpad.search_tasks(lambda task: task.target is self, **kwargs)
+
+
+class FakeProject(FakeTarget):
+
+    def __init__(self, launchpad, name):
+        FakeTarget.__init__(self, launchpad, '%s%s' % (api_root, name), name, name)
+        self.name = name
+        self.all_milestones = []
+
+    def getMilestone(self, name):
+        for milestone in self.all_milestones:
+            if milestone.name == name:
+                return milestone
+        return None
+
+
+class FakeSourcePackage(FakeTarget):
+
+    def __init__(self, launchpad, name, series=None):
+        if series:
+            path = 'ubuntu/%s/+source/%s' % (series.name, name)
+            bug_target_name = '%s (Ubuntu %s)' % (name, series.bug_target_label)
+        else:
+            path = 'ubuntu/+source/%s' % name
+            bug_target_name = '%s (Ubuntu)' % name
+        FakeTarget.__init__(self, launchpad, api_root + path, bug_target_name, path)
+        self.name = name
+        self.series = series
+
+
+class FakeSeries(FakeEntry):
+
+    def __init__(self, launchpad, name, displayname):
+        FakeEntry.__init__(self, launchpad, '%subuntu/%s' % (api_root, name))
+        self.name = name
+        self.displayname = displayname
+        self.bug_target_label = displayname[0].upper() + displayname[1:]
+
+
+class FakeDistribution(FakeEntry):
+
+    def __init__(self, launchpad, name):
+        FakeEntry.__init__(self, launchpad, '%s%s' % (api_root, name))
+        self.name = name
+        self.series = []
+        self.package_names = set()
+        self.source_packages = {}
+
+    def getSourcePackage(self, name, series=None):
+        self.launchpad.count('source_package')
+        if name not in self.package_names:
+            return None
+        key = (name, series and series.name)
+        if key not in self.source_packages:
+            self.source_packages[key] = FakeSourcePackage(self.launchpad, name, series)
+        return self.source_packages[key]
+
+
+class FakeBugTask(FakeEntry):
+
+    def __init__(self, launchpad, bug, target):
+        FakeEntry.__init__(self, launchpad, '%s%s/+bug/%s' % (api_root, target.path, bug.id))
+        self._bug = bug
+        self.target = target
+        self.bug_link = bug.self_link
+        self.web_link = '%s%s/+bug/%s' % (web_root, target.path, bug.id)
+        self.bug_target_name = target.bug_target_name
+        self.status = 'New'
+        self.importance = 'Undecided'
+        self.assignee = None
+        self.bug_watch = None
+        self.milestone = None
+
+    @property
+    def bug(self):
+        self.launchpad.count('bug')
+        return self._bug
+
+    @property
+    def title(self):
+        return 'Bug #%s in %s: "%s"' % (self._bug.id, self.bug_target_name, self._bug.title)
+
+    @property
+    def assignee_link(self):
+        return self.assignee and self.assignee.self_link
+
+    @property
+    def bug_watch_link(self):
+        return self.bug_watch and self.bug_watch.self_link
+
+    @property
+    def milestone_link(self):
+        return self.milestone and self.milestone.self_link
+
+    def lp_save(self):
+        FakeEntry.lp_save(self)
+        self._bug.touch()
+
+
+class FakeNomination(FakeEntry):
+
+    def __init__(self, launchpad, bug, series):
+        FakeEntry.__init__(self, launchpad, '%s/nominations/%s' % (bug.self_link, launchpad.next_id()))
+        self.bug = bug
+        self.series = series
+
+    def approve(self):
+        '''open a series task for all distribution tasks of the bug'''
+        self.launchpad.count('save')
+        distribution = self.launchpad.distributions['ubuntu']
+        for bug_task in list(self.bug.tasks):
+            if isinstance(bug_task.target, FakeSourcePackage) and not bug_task.target.series:
+                self.bug.addTask(distribution.getSourcePackage(name=bug_task.target.name, series=self.series))
+
+
+class FakeBug(FakeEntry):
+
+    def __init__(self, launchpad, bug_id, title, description=''):
+        FakeEntry.__init__(self, launchpad, '%sbugs/%s' % (api_root, bug_id))
+        self.id = bug_id
+        self.title = title
+        self.description = description
+        self.web_link = '%sbugs/%s' % (web_root, bug_id)
+        self.tags = []
+        self.duplicate_of = None
+        self.tasks = []
+        self.watches = []
+        self.touch()
+
+    @property
+    def bug_tasks(self):
+        self.launchpad.count('bug_tasks')
+        return list(self.tasks)
+
+    @property
+    def duplicate_of_link(self):
+        return self.duplicate_of and self.duplicate_of.self_link
+
+    def touch(self):
+        self.date_last_updated = datetime.datetime.utcnow()
+
+    def addTask(self, target):
+        self.launchpad.count('add_task')
+        if target is None:
+            raise BadRequest('target: Required input is missing.')
+        for bug_task in self.tasks:
+            if bug_task.target is target:
+                raise BadRequest('%s already has a task on %s' % (self.id, target.bug_target_name))
+        bug_task = FakeBugTask(self.launchpad, self, target)
+        self.tasks.append(bug_task)
+        self.touch()
+        return bug_task
+
+    def addWatch(self, bug_tracker, remote_bug):
+        self.launchpad.count('save')
+        watch = FakeBugWatch(self.launchpad, self, bug_tracker, remote_bug)
+        self.watches.append(watch)
+        return watch
+
+    def addNomination(self, target):
+        self.launchpad.count('save')
+        return FakeNomination(self.launchpad, self, target)
+
+    def lp_save(self):
+        FakeEntry.lp_save(self)
+        self.touch()
+
+
+class FakeBugs(object):
+
+    def __init__(self, launchpad):
+        self.launchpad = launchpad
+        self.bugs = collections.OrderedDict()
+
+    def __getitem__(self, bug_id):
+        self.launchpad.count('bug')
+        return self.bugs[int(bug_id)]
+
+    def __iter__(self):
+        return iter(self.bugs.values())
+
+    def createBug(self, title, description, target, tags=None):
+        self.launchpad.count('create_bug')
+        bug = FakeBug(self.launchpad, self.launchpad.next_id(), title, description)
+        bug.tags = list(tags or [])
+        self.bugs[bug.id] = bug
+        bug.addTask(target)
+        return bug
+
+
+class FakeCollection(object):
+    '''name: entry mapping, like launchpad.projects'''
+
+    def __init__(self, launchpad, kind, entries, case_sensitive=True):
+        self.launchpad = launchpad
+        self.kind = kind
+        self.entries = entries
+        self.case_sensitive = case_sensitive
+
+    def __getitem__(self, name):
+        self.launchpad.count(self.kind)
+        if not self.case_sensitive:
+            name = name.lower()
+        return self.entries[name]
+
+    def __iter__(self):
+        self.launchpad.count(self.kind)
+        return iter(self.entries.values())
+
+
+class FakeLaunchpad(object):
+
+    def __init__(self, fixture):
+        self.entries = {}
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.last_id = 100000
+        self.bugs = FakeBugs(self)
+
+        projects = collections.OrderedDict()
+        for name in fixture.get('projects', []):
+            projects[name] = FakeProject(self, name)
+        self.projects = FakeCollection(self, 'project', projects)
+
+        distributions = {}
+        for (name, content) in fixture.get('distributions', {}).items():
+            distribution = FakeDistribution(self, name)
+            for series in content.get('series', []):
+                distribution.series.append(FakeSeries(self, series['name'], series['displayname']))
+            distribution.package_names.update(content.get('source_packages', []))
+            distributions[name.lower()] = distribution
+        self.distributions = FakeCollection(self, 'distribution', distributions, case_sensitive=False)
+
+        people = {}
+        for name in fixture.get('people', []):
+            people[name] = FakePerson(self, name)
+        self.people = FakeCollection(self, 'person', people)
+
+        trackers = collections.OrderedDict()
+        for name in fixture.get('bug_trackers', []):
+            trackers[name] = FakeBugTracker(self, name)
+        self.bug_trackers = FakeCollection(self, 'bug_tracker', trackers)
+
+        for (project_name, milestones) in fixture.get('milestones', {}).items():
+            project = projects[project_name]
+            for milestone in milestones:
+                date_targeted = None
+                if milestone.get('date_targeted'):
+                    date_targeted = datetime.datetime.strptime(milestone['date_targeted'], '%Y-%m-%d')
+                project.all_milestones.append(FakeMilestone(self, project, milestone['name'], date_targeted))
+
+        for bug in fixture.get('bugs', []):
+            self.add_bug(bug)
+
+    def count(self, kind):
+        with self.lock:
+            self.calls[kind] += 1
+
+    def next_id(self):
+        with self.lock:
+            self.last_id += 1
+            return self.last_id
+
+    def get_target(self, target_name):
+        '''get a project or a source package from its bug_target_name'''
+        if target_name.endswith(')'):
+            (name, distribution) = target_name[:-1].split(' (', 1)
+            distribution = distribution.split(' ')
+            ubuntu = self.distributions.entries[distribution[0].lower()]
+            series = None
+            if len(distribution) > 1:
+                for candidate in ubuntu.series:
+                    if candidate.bug_target_label == distribution[1]:
+                        series = candidate
+            return ubuntu.getSourcePackage(name=name, series=series)
+        return self.projects.entries[target_name]
+
+    def add_bug(self, content):
+        '''add a bug described as in the fixtures, return it'''
+        if content.get('id'):
+            self.last_id = max(self.last_id, content['id'])
+            bug_id = content['id']
+        else:
+            bug_id = self.next_id()
+        bug = FakeBug(self, bug_id, content['title'], content.get('description', ''))
+        bug.tags = list(content.get('tags', []))
+        self.bugs.bugs[bug.id] = bug
+        for task_content in content.get('tasks', []):
+            bug_task = FakeBugTask(self, bug, self.get_target(task_content['target']))
+            bug_task.status = task_content.get('status', 'New')
+            bug_task.importance = task_content.get('importance', 'Undecided')
+            if task_content.get('assignee'):
+                bug_task.assignee = self.people.entries[task_content['assignee']]
+            if task_content.get('milestone'):
+                bug_task.milestone = bug_task.target.getMilestone(task_content['milestone'])
+            bug.tasks.append(bug_task)
+        if content.get('duplicate_of'):
+            bug.duplicate_of = self.bugs.bugs[content['duplicate_of']]
+        return bug
+
+    def load(self, link):
+        self.count('load')
+        return self.entries[link]
+
+    def search_tasks(self, matcher, status=None, modified_since=None, omit_duplicates=True, **kwargs):
+        '''what all searchTasks() are doing'''
+        self.count('search')
+        if not status:
+            status = open_statuses
+        elif not isinstance(status, (list, tuple)):
+            status = (status,)
+        if modified_since and not isinstance(modified_since, datetime.datetime):
+            modified_since = datetime.datetime.strptime(modified_since[:19], '%Y-%m-%dT%H:%M:%S')
+        result = []
+        for bug in self.bugs.bugs.values():
+            if omit_duplicates and bug.duplicate_of:
+                continue
+            if modified_since and bug.date_last_updated < modified_since:
+                continue
+            for bug_task in bug.tasks:
+                if bug_task.status in status and matcher(bug_task):
+                    result.append(bug_task)
+        return result
+
+
+class BadRequest(lazr.restfulclient.errors.BadRequest):
+    '''What launchpad answers to an invalid request, without the http response'''
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
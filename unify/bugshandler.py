@@ -16,18 +16,36 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import datetime
 import lazr
 import logging
 import os
-import re
 import textwrap
 
 from unify import launchpadmanager
+from unify.bugstore import get_bug_store, get_id_from_link, prefetch_bugs, snapshot_task
+from unify.metaprojects import get_target_index
+from unify.metrics import timed
+from unify.personcache import get_person_cache
+from unify.syncplan import get_plan
+from unify.targets import parse_target
+from unify.writequeue import get_write_queue
 launchpad = launchpadmanager.getLaunchpad()
 
 invalid_status_to_open_bug = ("Invalid", "Opinion", "Won't Fix", "Expired", "Incomplete")
 invalid_status_to_take_bugtask_into_account = ("Invalid", "Opinion", "Won't Fix", "Expired") # we can have ayatana-design/unity (upstream): incomplete/compiz (downstream): incomplete
-old_releases = ("(Ubuntu Lucid)", "(Ubuntu Maverick)", "(Ubuntu Natty)", "(Ubuntu Oneiric)")
+# master task statuses reported by get_bug_mastered_track_reports (closed ones are searched by log_newly_closed_bugs)
+tracker_statuses = ("New", "Confirmed", "Triaged", "In Progress", "Incomplete", "Opinion", "Fix Committed")
+# status history category of master tasks in those statuses (Fix Committed ones are triaged further)
+status_categories = {"New": "untriaged", "Confirmed": "untriaged", "Triaged": "signed_off", "In Progress": "signed_off",
+                     "Incomplete": "design_hold", "Opinion": "design_hold"}
+# define an order for status:
+status_weight = {"New": 0, "Incomplete": 1, "Opinion": 2, "Invalid": 3, "Won't Fix": 4, "Expired": 5, "Confirmed": 6, "Triaged": 7, "In Progress": 8, "Fix Committed": 9, "Fix Released": 10}
+# (master upstream, upstream, downstream, design status, master relevant): statuses to sync to, filled by resolve_statuses()
+status_transitions = {}
+
+# number of design bugs from which the report classification is done with numpy, when available
+vectorized_threshold = 500
 
 design_name = "ayatana-design"
 db = None
@@ -41,13 +59,8 @@ def reportUpstreamName(bug_target_name):
     
     Return: is_upstream, upstream_name"""
 
-    try:
-        bug_target_name = re.search("(.*) \(Ubuntu.*\)",  bug_target_name).group(1)
-        is_upstream = False
-    except AttributeError:
-        # upstream task
-        is_upstream = True
-    return (is_upstream, bug_target_name)
+    target = parse_target(bug_target_name)
+    return (target.is_upstream, target.project)
 
 def closeAllUpstreamBugs(bugs, upstream_filter):
     """ close all upstream bugs from the lists which are in upstream_filter """
@@ -58,9 +71,8 @@ def closeAllUpstreamBugs(bugs, upstream_filter):
             project_name = bug_task.bug_target_name
             if (project_name in upstream_filter and
                 bug_task.status != "Fix Released"):
-                logging.info("Close in fix released: %s" % bug_task.title)
-                bug_task.status = "Fix Released"
-                bug_task.lp_save()
+                logging.info("Close in fix released: %s (%s)" % (bug.title, project_name))
+                get_write_queue().set(bug_task, status="Fix Released")
 
 # TODO: for sync state, don't use getRelevantbugLayout and just sync the status directly
     
@@ -84,6 +96,7 @@ def getRelevantbugLayout(bugs, meta_project, upstream_filter, downstream_filter)
     # FIXME: the project should not strip (Ubuntu) in the downstream list
     # That will enable to remove the hack in openDownstreamBugsByProject()
     # for Ubuntu packages
+    targets = get_target_index(upstream_filter, downstream_filter)
     relevant_bugs_dict = {}
     for bug in bugs.values():
         # ignore duplicates
@@ -91,18 +104,19 @@ def getRelevantbugLayout(bugs, meta_project, upstream_filter, downstream_filter)
             continue
         relevant_bugs_dict[bug] = {}
         for bug_task in bug.bug_tasks:
-            project = bug_task.bug_target_name
-            if not project in upstream_filter and not project in downstream_filter:
+            target = targets.get(bug_task.bug_target_name)
+            if not target:
                 continue
-            (is_upstream, project) = reportUpstreamName(project)
+            (project, is_upstream) = target
             if not project in relevant_bugs_dict[bug]:
-                # create upstream and downstream task to None
-                relevant_bugs_dict[bug][project] = {True: None, False: None}
+                # create upstream and downstream task to None, but only a downstream one for tasks
+                # like compiz, metacity: only downstream in filter and we don't want to open an
+                # upstream one (as not handled in launchpad)
+                if project in upstream_filter:
+                    relevant_bugs_dict[bug][project] = {True: None, False: None}
+                else:
+                    relevant_bugs_dict[bug][project] = {False: None}
             relevant_bugs_dict[bug][project][is_upstream] = bug_task
-            # remove upstream task if tasks like compiz, metacity: only one downstream in filter
-            # and we don't want to open an upstream one (as not handled in launchpad)
-            if project not in upstream_filter and True in relevant_bugs_dict[bug][project]:
-                relevant_bugs_dict[bug][project].pop(True)
                 
         # Now, the logic to determine if we should remove the meta_project
         # or not open an upstream or downstream task
@@ -148,29 +162,60 @@ def getRelevantbugLayout(bugs, meta_project, upstream_filter, downstream_filter)
     logging.debug("Relevant bug tasks: %s" % relevant_bugs_dict)
     return relevant_bugs_dict
 
+@timed('fetch')
 def getAgregatedUpstreamDownstreamBugs(project_name):
-    """ get a merge from upstream and downstream bugs for a project """
+    """ get a merge from upstream and downstream bugs for a project
+
+    bugs are read from the local mirror, which is first refreshed with what
+    changed on launchpad since the last sync"""
     
+    store = get_bug_store()
     project = launchpad.projects[project_name]
     package = launchpad.distributions['ubuntu'].getSourcePackage(name = project_name)
-    bugs = {}
-    for bug_task in project.searchTasks():
-        bugs[re.search("(.*)/([0-9]+)", bug_task.self_link).group(2)] = bug_task.bug
-    for bug_task in package.searchTasks():
-        bugs[re.search("(.*)/([0-9]+)", bug_task.self_link).group(2)] = bug_task.bug
-    return bugs
+    store.refresh_target(project_name, project)
+    store.refresh_target("%s (Ubuntu)" % project_name, package)
+    return store.get_open_bugs_for_targets((project_name, "%s (Ubuntu)" % project_name))
+
+class BugSession():
+    """ bugs of each project fetched once and shared by all passes of a sync run
+
+    The same bug object is handed to every project it belongs to, so that a status
+    or a task changed by one pass is seen by the next ones."""
+
+    def __init__(self):
+        self.bugs = {}
+        self.bugs_by_project = {}
+
+    def get_bugs(self, project_name):
+        """ get the aggregated upstream and downstream bugs of project_name """
+        if project_name not in self.bugs_by_project:
+            project_bugs = {}
+            for (bug_id, bug) in getAgregatedUpstreamDownstreamBugs(project_name).items():
+                project_bugs[bug_id] = self.bugs.setdefault(bug_id, bug)
+            self.bugs_by_project[project_name] = project_bugs
+        return self.bugs_by_project[project_name]
+
+    def merge_new_task(self, bug, new_task):
+        """ add a bug to the scope of the project new_task was just opened on """
+        (is_upstream, project_name) = reportUpstreamName(new_task.bug_target_name)
+        if project_name in self.bugs_by_project:
+            self.bugs_by_project[project_name][bug.id] = self.bugs.setdefault(bug.id, bug)
     
 
-def syncbugsForProject(project_name, meta_project, upstream_filter, downstream_filter):
+def syncbugsForProject(project_name, meta_project, upstream_filter, downstream_filter, session=None):
     """ open all relevant upstream and downstream tasks for the full project """
 
     # get all bugs scope for the project but don't open them for fix released one on the entire scope
     # (avoid a lot of initial spam)
-    bugs = getAgregatedUpstreamDownstreamBugs(project_name)
-    syncbugs(bugs, meta_project, upstream_filter, downstream_filter, False)
+    if session:
+        bugs = session.get_bugs(project_name)
+    else:
+        bugs = getAgregatedUpstreamDownstreamBugs(project_name)
+    syncbugs(bugs, meta_project, upstream_filter, downstream_filter, False, session)
     
 
-def syncbugs(bugs, meta_project, upstream_filter, downstream_filter, open_for_fixreleased=False):
+@timed('layout')
+def syncbugs(bugs, meta_project, upstream_filter, downstream_filter, open_for_fixreleased=False, session=None):
     """ open all relevant downstream and upstream tasks for projects in upstream_filter limited to the bugs content""" 
     
     relevant_bugs_dict = getRelevantbugLayout(bugs, meta_project, upstream_filter, downstream_filter)
@@ -188,29 +233,41 @@ def syncbugs(bugs, meta_project, upstream_filter, downstream_filter, open_for_fi
                             open_bug = False
                     if open_bug:
                         logging.debug("Open task for %s, upstream (%s): https://bugs.launchpad.net/bugs/%i, %s" % (project_name, is_upstream, bug.id, bug.title))
-                        if is_upstream:
-                            component_to_open = launchpad.projects[project_name]
+                        if get_plan():
+                            new_task = get_plan().open_task(bug, project_name, is_upstream)
                         else:
-                            component_to_open = launchpad.distributions['ubuntu'].getSourcePackage(name = project_name)
-                        try:
-                            new_task = bug.addTask(target=component_to_open)
-                            relevant_bugs_dict[bug][project_name][is_upstream] = new_task
-                        except (lazr.restfulclient.errors.ServerError, lazr.restfulclient.errors.BadRequest), e:
-                            pass
+                            if is_upstream:
+                                component_to_open = launchpad.projects[project_name]
+                            else:
+                                component_to_open = launchpad.distributions['ubuntu'].getSourcePackage(name = project_name)
+                            try:
+                                new_task = bug.addTask(target=component_to_open)
+                            except (lazr.restfulclient.errors.ServerError, lazr.restfulclient.errors.BadRequest), e:
+                                continue
+                        relevant_bugs_dict[bug][project_name][is_upstream] = new_task
+                        if session:
+                            session.merge_new_task(bug, new_task)
 
 def needs_log_no_action(bugid, component, new_status, design_status):
     """ decide if an action needs to be logged rather than commited """
     
     if new_status in invalid_status_to_open_bug and not design_status:
-        log_file = open(os.path.expanduser("~/.unity_bugtriage.log"), "a")
         message = "Bug https://bugs.launchpad.net/bugs/%i: %s should be set to %s, but no %s task\n" % (bugid, component, new_status, design_name)
-        log_file.write(message)
-        logging.info(message)
-        log_file.close()
+        if get_plan():
+            get_plan().log(message)
+        else:
+            log_triage_message(message)
         return True
     return False
 
-def syncstatus(project_name, meta_project):
+def log_triage_message(message):
+    """ log an action which needs a human rather than being commited """
+    log_file = open(os.path.expanduser("~/.unity_bugtriage.log"), "a")
+    log_file.write(message)
+    logging.info(message)
+    log_file.close()
+
+def syncstatus(project_name, meta_project, session=None):
     """ sync bug status for a project
     
     The rule is pretty simple: sync the "most advance" bug status.
@@ -223,169 +280,211 @@ def syncstatus(project_name, meta_project):
     """
     
     # at this stage, all upstream and downstream correspondant bugs are supposed to be opened by previous commodities
-    bugs = getAgregatedUpstreamDownstreamBugs(project_name)
-    
-    # define an order for status:
-    status_weight = {"New": 0, "Incomplete": 1, "Opinion": 2, "Invalid": 3, "Won't Fix": 4, "Expired": 5, "Confirmed": 6, "Triaged": 7, "In Progress": 8, "Fix Committed": 9, "Fix Released": 10}
+    if session:
+        bugs = session.get_bugs(project_name)
+    else:
+        bugs = getAgregatedUpstreamDownstreamBugs(project_name)
     
     for bug in bugs.values():
         # ignore duplicates
         if bug.duplicate_of:
             continue
-        upstream_task = None
-        downstream_task = None
-        master_upstream_task = None
-        master_downstream_task = None
-        design_task = None
-        for bug_task in bug.bug_tasks:
-            project = bug_task.bug_target_name
-            # ignore old releases
-            skip = False
-            for old_release in old_releases:
-                if old_release in project:
-                    skip = True
-            if skip:
-                continue
-            # only get some interest in that project. Not fully optimized, but well…
-            try:
-                project = re.search("(.*) \(Ubuntu.*\)",  project).group(1)
-                if project == project_name:
-                    downstream_task = bug_task
-                if project == meta_project:
-                    master_downstream_task = bug_task
-            except AttributeError:
-                # upstream task
-                if project == project_name:
-                    upstream_task = bug_task
-                if project == meta_project:
-                    master_upstream_task = bug_task
-                if project == design_name:
-                    design_task = bug_task
-
-        # check that there is something to sync
-        if not upstream_task or not downstream_task:
-            continue 
-        
-        # status
-        master_upstream_status = None
-        design_status = None
+        syncbugstatus(bug, project_name, meta_project)
+
+def resolve_statuses(master_upstream_status, upstream_status, downstream_status, design_status, master_bug_relevant):
+    """ statuses to sync the master upstream, upstream and downstream tasks to (see syncstatus for the rules)
+
+    The result only depends on the arguments, so each combination is computed
+    once and then looked up in status_transitions."""
+    key = (master_upstream_status, upstream_status, downstream_status, design_status, master_bug_relevant)
+    try:
+        return status_transitions[key]
+    except KeyError:
+        status_transitions[key] = _compute_statuses(*key)
+        return status_transitions[key]
+
+def _compute_statuses(master_upstream_status, upstream_status, downstream_status, design_status, master_bug_relevant):
+    """ apply the status sync rules, see resolve_statuses() """
+
+    # sync upstream from master if more advanced
+    if master_bug_relevant:
+        if (status_weight[master_upstream_status] > status_weight[upstream_status]):
+            upstream_status = master_upstream_status
+    
+    # sync downstream to upstream if relevant (FIXME: should check
+    # milestone)
+    if (status_weight[upstream_status] > status_weight[downstream_status]) and upstream_status != "Fix Released":
+        downstream_status = upstream_status
+
+    # sync upstream to downstream if relevant
+    if (status_weight[downstream_status] >  status_weight[upstream_status]) and downstream_status != "Fix Committed" and downstream_status != "Fix Released":
+        upstream_status = downstream_status
+
+    # sync now upstream (or downstream, doesn't matter) to master if relevant
+    if master_bug_relevant:
+        if (status_weight[upstream_status] > status_weight[master_upstream_status]):
+            master_upstream_status = upstream_status
+    
+    # bring the ayatana-design task to the dance
+    if design_status:
+        status_to_sync = None
+        # if design says invalid (and not invalid task)
+        if design_status in ("Opinion", "Won't Fix"):
+            status_to_sync = design_status
+        # if design says "Fix committed" or "Fix released", set the bug to "triaged" if < Triaged
+        if design_status in ("Fix committed", "Fix released"):
+            if (master_bug_relevant and status_weight[master_upstream_status] < status_weight["Triaged"] and master_upstream_status != "Invalid" and
+                status_weight[upstream_status] < status_weight["Triaged"] and upstream_status != "Invalid" and
+                status_weight[downstream_status] < status_weight["Triaged"] and downstream_status != "Invalid"):
+                status_to_sync = "Triaged"
+        if status_to_sync:
+            # reduce the noise
+            if master_bug_relevant and master_upstream_status not in invalid_status_to_open_bug:
+                master_upstream_status = status_to_sync
+            if upstream_status not in invalid_status_to_open_bug:
+                upstream_status = status_to_sync
+            if downstream_status not in invalid_status_to_open_bug:
+                downstream_status = status_to_sync
+
+    return (master_upstream_status, upstream_status, downstream_status)
+
+@timed('status_sync')
+def syncbugstatus(bug, project_name, meta_project):
+    """ sync bug status of a single bug for a project (see syncstatus for the rules) """
+
+    upstream_task = None
+    downstream_task = None
+    master_upstream_task = None
+    master_downstream_task = None
+    design_task = None
+    for bug_task in bug.bug_tasks:
+        target = parse_target(bug_task.bug_target_name)
+        # ignore old releases
+        if target.old_release:
+            continue
+        # only get some interest in that project
+        project = target.project
+        if not target.is_upstream:
+            if project == project_name:
+                downstream_task = bug_task
+            if project == meta_project:
+                master_downstream_task = bug_task
+        else:
+            # upstream task
+            if project == project_name:
+                upstream_task = bug_task
+            if project == meta_project:
+                master_upstream_task = bug_task
+            if project == design_name:
+                design_task = bug_task
+
+    # check that there is something to sync
+    if not upstream_task or not downstream_task:
+        return
+    
+    # status
+    master_upstream_status = None
+    design_status = None
+    if master_upstream_task:
+        master_upstream_status = master_upstream_task.status
+    if design_task:
+        design_status = design_task.status
+    upstream_status = upstream_task.status
+    downstream_status = downstream_task.status
+    
+    # look at the meta_project status if relevant:
+    # if there is a master downstream bug, discare it, other sync upstream from master
+    master_bug_relevant = False
+    if meta_project != project_name:
+        if master_downstream_task:
+            master_upstream_task = None
         if master_upstream_task:
-            master_upstream_status = master_upstream_task.status
-        if design_task:
-            design_status = design_task.status
-        upstream_status = upstream_task.status
-        downstream_status = downstream_task.status
-        
-        # look at the meta_project status if relevant:
-        # if there is a master downstream bug, discare it, other sync upstream from master
-        master_bug_relevant = False
-        if meta_project != project_name:
-            if master_downstream_task:
-                master_upstream_task = None
-            if master_upstream_task:
-                master_bug_relevant = True
-                if (status_weight[master_upstream_status] > status_weight[upstream_status]):
-                    upstream_status = master_upstream_status
-        
-        # sync downstream to upstream if relevant (FIXME: should check
-        # milestone)
-        if (status_weight[upstream_status] > status_weight[downstream_status]) and upstream_status != "Fix Released":
-            downstream_status = upstream_status
-
-        # sync upstream to downstream if relevant
-        if (status_weight[downstream_status] >  status_weight[upstream_status]) and downstream_status != "Fix Committed" and downstream_status != "Fix Released":
-            upstream_status = downstream_status
-
-        # sync now upstream (or downstream, doesn't matter) to master if relevant
-        if master_bug_relevant:
-            if (status_weight[upstream_status] > status_weight[master_upstream_status]):
-                master_upstream_status = upstream_status
-        
-        # bring the ayatana-design task to the dance
-        if design_status:
-            status_to_sync = None
-            # if design says invalid (and not invalid task)
-            if design_status in ("Opinion", "Won't Fix"):
-                status_to_sync = design_status
-            # if design says "Fix committed" or "Fix released", set the bug to "triaged" if < Triaged
-            if design_status in ("Fix committed", "Fix released"):
-                if (master_bug_relevant and status_weight[master_upstream_status] < status_weight["Triaged"] and master_upstream_status != "Invalid" and
-                    status_weight[upstream_status] < status_weight["Triaged"] and upstream_status != "Invalid" and
-                    status_weight[downstream_status] < status_weight["Triaged"] and downstream_status != "Invalid"):
-                    status_to_sync = "Triaged"
-            if status_to_sync:
-                # reduce the noise
-                if master_bug_relevant and master_upstream_status not in invalid_status_to_open_bug:
-                    master_upstream_status = status_to_sync
-                if upstream_status not in invalid_status_to_open_bug:
-                    upstream_status = status_to_sync
-                if downstream_status not in invalid_status_to_open_bug:
-                    downstream_status = status_to_sync
-        
-        # sync status back
-        bug_id = bug.id
-        if (master_upstream_task and master_upstream_task.status != master_upstream_status):
-            if not needs_log_no_action(bug_id, "Master", master_upstream_status, design_status):
-                logging.info("Master bug https://bugs.launchpad.net/bugs/%i status set to %s" % (bug_id, master_upstream_status))
-                master_upstream_task.status = master_upstream_status
-                master_upstream_task.lp_save()
-        if (upstream_task.status != upstream_status):
-            if not needs_log_no_action(bug_id, "Upstream", upstream_status, design_status):
-                logging.info("Upstream bug https://bugs.launchpad.net/bugs/%i status set to %s" % (bug_id, upstream_status))
-                upstream_task.status = upstream_status
-                upstream_task.lp_save()
-        if (downstream_task.status != downstream_status):
-            if not needs_log_no_action(bug_id, "Downstream", downstream_status, design_status):
-                logging.info("Downstream bug https://bugs.launchpad.net/bugs/%i status set to %s" % (bug_id, downstream_status))
-                downstream_task.status = downstream_status
-                downstream_task.lp_save()
-
-def setimportance(project_name, meta_project):
+            master_bug_relevant = True
+
+    (master_upstream_status, upstream_status, downstream_status) = resolve_statuses(master_upstream_status, upstream_status,
+                                                                                    downstream_status, design_status, master_bug_relevant)
+
+    # sync status back
+    bug_id = bug.id
+    if (master_upstream_task and master_upstream_task.status != master_upstream_status):
+        if not needs_log_no_action(bug_id, "Master", master_upstream_status, design_status):
+            logging.info("Master bug https://bugs.launchpad.net/bugs/%i status set to %s" % (bug_id, master_upstream_status))
+            get_write_queue().set(master_upstream_task, status=master_upstream_status)
+    if (upstream_task.status != upstream_status):
+        if not needs_log_no_action(bug_id, "Upstream", upstream_status, design_status):
+            logging.info("Upstream bug https://bugs.launchpad.net/bugs/%i status set to %s" % (bug_id, upstream_status))
+            get_write_queue().set(upstream_task, status=upstream_status)
+    if (downstream_task.status != downstream_status):
+        if not needs_log_no_action(bug_id, "Downstream", downstream_status, design_status):
+            logging.info("Downstream bug https://bugs.launchpad.net/bugs/%i status set to %s" % (bug_id, downstream_status))
+            get_write_queue().set(downstream_task, status=downstream_status)
+
+def setimportance(project_name, meta_project, session=None):
     """ set bug importance for a project
     
     The rule is pretty simple: all crashers is critical
     """
     
     # at this stage, all upstream and downstream correspondant bugs are supposed to be opened by previous commodities
-    bugs = getAgregatedUpstreamDownstreamBugs(project_name)            
+    if session:
+        bugs = session.get_bugs(project_name)
+    else:
+        bugs = getAgregatedUpstreamDownstreamBugs(project_name)            
 
     for bug in bugs.values():
         # ignore duplicates
         if bug.duplicate_of:
             continue
+        setbugimportance(bug, project_name)
 
-        need_set_to_critical = 'apport-crash' in bug.tags
-        if not need_set_to_critical:
+@timed('importance')
+def setbugimportance(bug, project_name):
+    """ set importance of a single bug for a project (see setimportance for the rule) """
+
+    need_set_to_critical = 'apport-crash' in bug.tags
+    if not need_set_to_critical:
+        return
+
+    for bug_task in bug.bug_tasks:
+        if (bug_task.status in invalid_status_to_open_bug or bug_task.status == "Fix Released"):
+            continue
+        # only work on that component (strip package name info to get upstream name)
+        # old release tasks are not skipped: their importance is set as well
+        if parse_target(bug_task.bug_target_name).project != project_name:
+            continue
+        # only change status for Medium priority (which are the new ones)
+        if bug_task.importance != 'Medium':
             continue
 
-        for bug_task in bug.bug_tasks:
-            if (bug_task.status in invalid_status_to_open_bug or bug_task.status == "Fix Released"):
-                continue
-            project = bug_task.bug_target_name
-            # ignore old releases
-            for old_release in old_releases:
-                if old_release in project:
-                    continue
-            # only work on that component (strip package name info to get upstream name)
-            try:
-                project = re.search("(.*) \(Ubuntu.*\)",  project).group(1)
-            except AttributeError:
-                pass
-            if project != project_name:
-                continue
-            # only change status for Medium priority (which are the new ones)
-            if bug_task.importance != 'Medium':
-                continue
+        if bug_task.importance != 'Critical':
+            logging.info("Setting a task importance at crash https://bugs.launchpad.net/bugs/%i as critical" % bug.id)
+            get_write_queue().set(bug_task, importance='Critical')
 
-            if bug_task.importance != 'Critical':
-                logging.info("Setting a task importance at crash https://bugs.launchpad.net/bugs/%i as critical" % bug.id)
-                bug_task.importance = 'Critical'
-                try:
-                    bug_task.lp_save()
-                except (lazr.restfulclient.errors.Unauthorized, lazr.restfulclient.errors.PreconditionFailed), e:
-                    pass
-                
+def syncpool(meta_project, upstream_filter, downstream_filter, session=None):
+    """ open relevant tasks, sync status and importance for all projects of meta_project at once
+
+    Bugs shared by multiple projects are only laid out and synced once, taking
+    each of their projects in the upstream_filter order."""
+
+    if not session:
+        session = BugSession()
+    bugs = {}
+    for project_name in upstream_filter:
+        bugs.update(session.get_bugs(project_name))
+    syncbugs(bugs, meta_project, upstream_filter, downstream_filter, False, session)
+
+    # opening tasks can have brought some bugs in more projects scope
+    for bug in bugs.values():
+        # ignore duplicates
+        if bug.duplicate_of:
+            continue
+        bug_projects = [project_name for project_name in upstream_filter if bug.id in session.get_bugs(project_name)]
+        for project_name in bug_projects:
+            syncbugstatus(bug, project_name, meta_project)
+        for project_name in bug_projects:
+            setbugimportance(bug, project_name)
     
+
 def getFormattedDownstreamBugs(bugs):
     """ get a formatted bug with one line and (LP: #xxxx) numerotation for all downstreams bugs """
 
@@ -396,7 +495,7 @@ def getFormattedDownstreamBugs(bugs):
         for bug_task in bug.bug_tasks:
             component = bug_task.bug_target_name
             if isValidDownstreamBug(component) and bug_task.status not in invalid_status_to_open_bug:
-                component_name = re.search("(.*) \(Ubuntu.*\)", component).group(1)
+                component_name = parse_target(component).project
                 if not component_name in changelog_by_line:
                     changelog_by_line[component_name] = []
                 changelog_by_line[component_name].append(formatted_entry)
@@ -421,10 +520,45 @@ def getPackagesFormattedChangelog(bugs):
         print "-------------------------- %s --------------------------" % package
         print "\n".join(content)
                 
-def get_bug_mastered_track_reports(master_task, db, subset_bugs=None):
+@timed('reports')
+def get_bug_mastered_track_reports_for_trackers(master_tasks, db, subset_bugs=None, tracker_tasks=None):
+    """ get_bug_mastered_track_reports for multiple trackers, fetching bugs shared by them only once
+
+    tracker_tasks is a dict of master_task: get_tracker_tasks() result for those already fetched
+    
+    return: a dict of master_task: get_bug_mastered_track_reports() result"""
+
+    if tracker_tasks is None:
+        tracker_tasks = {}
+    for master_task in master_tasks:
+        if master_task not in tracker_tasks:
+            tracker_tasks[master_task] = get_tracker_tasks(master_task, subset_bugs)
+
+    # bugs with a Fix Committed master task need all their tasks, others only the bug itself
+    full_bug_links = set()
+    light_bug_links = set()
+    for master_task in master_tasks:
+        for bugstatus in tracker_tasks[master_task]:
+            for bug_task in tracker_tasks[master_task][bugstatus]:
+                if bugstatus == "Fix Committed":
+                    full_bug_links.add(bug_task.bug_link)
+                else:
+                    light_bug_links.add(bug_task.bug_link)
+    parent_bugs = prefetch_bugs(full_bug_links)
+    parent_bugs.update(prefetch_bugs(light_bug_links - full_bug_links, with_tasks=False))
+
+    reports = {}
+    for master_task in master_tasks:
+        reports[master_task] = get_bug_mastered_track_reports(master_task, db, subset_bugs, tracker_tasks[master_task], parent_bugs)
+    return reports
+
+@timed('reports')
+def get_bug_mastered_track_reports(master_task, db, subset_bugs=None, tracker_tasks=None, parent_bugs=None):
     """ get all bugs triaged by category compared to master task
     
     subset_bugs is for unit tests
+    tracker_tasks is the result of get_tracker_tasks() if already fetched
+    parent_bugs is a dict of bug_link: BugRecord of already fetched bugs
     
     return: bugs not yet triaged (a)
             bugs on design hold (b)
@@ -438,7 +572,8 @@ def get_bug_mastered_track_reports(master_task, db, subset_bugs=None):
             a, b, c, g, h bugs are a dict of bug_link: (bug title, importance, assignee)
             d, e, f bugs are dict of projects: (bug_link, bug_title, importance, assignee)"""
 
-    project = launchpad.projects[master_task]
+    if tracker_tasks is None:
+        tracker_tasks = get_tracker_tasks(master_task, subset_bugs)
 
     untriaged_bugs = {}
     officially_signed_off = {}
@@ -450,126 +585,66 @@ def get_bug_mastered_track_reports(master_task, db, subset_bugs=None):
     bugs_in_invalid_state = {}
     
     # simple cases first when looking only at the master task status
-    get_bug_master_track_bug_status(project, "New", untriaged_bugs, db, subset_bugs)
-    get_bug_master_track_bug_status(project, "Confirmed", untriaged_bugs, db, subset_bugs)
-    get_bug_master_track_bug_status(project, "Triaged", officially_signed_off, db, subset_bugs)
-    get_bug_master_track_bug_status(project, "In Progress", officially_signed_off, db, subset_bugs)
-    get_bug_master_track_bug_status(project, "Incomplete", bugs_on_design_hold, db, subset_bugs)
-    get_bug_master_track_bug_status(project, "Opinion", bugs_on_design_hold, db, subset_bugs)    
+    simple_cases = (("New", untriaged_bugs), ("Confirmed", untriaged_bugs),
+                    ("Triaged", officially_signed_off), ("In Progress", officially_signed_off),
+                    ("Incomplete", bugs_on_design_hold), ("Opinion", bugs_on_design_hold))
+    if parent_bugs is None:
+        parent_bugs = {}
+    bugs = tracker_tasks["Fix Committed"]
+    parent_bugs.update(prefetch_bugs([design_bug_task.bug_link for design_bug_task in bugs
+                                      if design_bug_task.bug_link not in parent_bugs]))
+    parent_bugs.update(prefetch_bugs([bug_task.bug_link for (bugstatus, bug_dict) in simple_cases for bug_task in tracker_tasks[bugstatus]
+                                      if bug_task.bug_link not in parent_bugs], with_tasks=False))
+    # links of all open bugs, to remove from the closed ones at once
+    open_links = set()
+    for (bugstatus, bug_dict) in simple_cases:
+        get_bug_master_track_bug_status(tracker_tasks[bugstatus], parent_bugs, bug_dict, open_links)
 
     # More complicate cases where it can be either ready to develop upstream, 
     # or ready to land/develop downstream
-    if subset_bugs:
-        bugs = searchTasks_forstatus_in_reduce_scope(project.name, subset_bugs, "Fix Committed")
-    else:
-        bugs = project.searchTasks(status="Fix Committed")
+    triaged_bugs = []
     for design_bug_task in bugs:
-        parent_bug = design_bug_task.bug
+        parent_bug = parent_bugs[design_bug_task.bug_link]
         if parent_bug.duplicate_of:
             continue
-        bug_content = {}
-        for child_task in parent_bug.bug_tasks:
-            target_project = child_task.bug_target_name
-            # ignore the master tracking task
-            if target_project == master_task:
-                continue
-            # ignore old release status
-            skip = False
-            for old_release in old_releases:
-                if old_release in target_project:
-                    skip = True
-            if skip:
-                continue
-            # ignore if there is a bug watch (not a real upstream bug for us to work on)
-            if child_task.bug_watch:
-                continue
-            (is_upstream, target_project) = reportUpstreamName(target_project)                
-            if not target_project in bug_content:
-                # create upstream and downstream task to None
-                bug_content[target_project] = {True: None, False: None}
-            assignee_name = ""
-            if child_task.assignee:
-                assignee_name = child_task.assignee.name
-            bug_content[target_project][is_upstream] = (child_task.web_link, child_task.bug.title, child_task.status, child_task.importance, assignee_name)
-            
-        # ok, now let's triage this. There are multiple cases:
-        # A: 1 upstream (!= fix committed, fix released), 0 or 1 downstream matching -> some work needed by upstream dev. Opening downstream task if none (if status is valid).
-        # B: 1 upstream (== fix committed or fix released), 0 or 1 downstream matching (!= fix released) -> needs to land in distro. Opening downstream task if none (if status is valid).
-        # C: 1 downstream without upstream matching (!= fix released) -> some work needed by downstream dev  
-        # D: all tasks with (0/1 upstream, all downstream (== fix released)) -> ready for review by the change design owner
-        all_downstream_closed = True
-        at_least_one_downstream = False
-        added_somewhere = False
-        for target_project in bug_content:
-            # A, B or D (valid upstream bug)
-            if bug_content[target_project][True] and bug_content[target_project][True][2] not in invalid_status_to_open_bug:
-                link, title, status, importance, assignee = bug_content[target_project][True]
-                # a downstream bug is maybe needed
-                try:
-                    if not bug_content[target_project][False]:
-                        component_to_open = launchpad.distributions['ubuntu'].getSourcePackage(name = target_project)
-                        new_task = parent_bug.addTask(target=component_to_open)
-                        logging.info("Adding downstream tasks for %s" % design_bug_task.web_link)
-                        bug_content[target_project][False] = (new_task.web_link, new_task.bug.title, new_task.status, new_task.importance, None)
-                        all_downstream_closed = False # we just opened the bug, obviously not landed yet. invalidate D
-                    at_least_one_downstream = True # we have at least a valid downstream bug
-                except (lazr.restfulclient.errors.HTTPError, lazr.restfulclient.errors.RestfulError, lazr.restfulclient.errors.ResponseError), e:
-                    continue # this upstream doesn't count
-                # A
-                if status not in ('Fix Committed', 'Fix Released'):
-                    bug_to_add = (link, title, importance, assignee)
-                    add_to_project_bug(ready_to_develop_upstream, target_project, bug_to_add)
-                    added_somewhere = True
-                    (downstream_link, downstream_title, downstream_status, downstream_importance, downstream_assignee) = bug_content[target_project][False]
-                    # Something landed upstream. Ignore invalid_status_to_open_bug as this should mean
-                    # we have something downstream to land.
-                    # /!\ unity, as used as a metatarget though is ignoring this exception as invalid is possible…
-                    if downstream_status != 'Fix Released' and (target_project != 'unity' or downstream_status not in invalid_status_to_open_bug):
-                        all_downstream_closed = False # invalidate D
-                # B or D
-                else:
-                    # Same remark as above
-                    (downstream_link, downstream_title, downstream_status, downstream_importance, downstream_assignee) = bug_content[target_project][False]
-                    # B
-                    if downstream_status != 'Fix Released' and (target_project != 'unity' or downstream_status not in invalid_status_to_open_bug):
-                        bug_to_add = (downstream_link, downstream_title, downstream_importance, downstream_assignee)
-                        add_to_project_bug(ready_to_land_downstream, target_project, bug_to_add)
-                        all_downstream_closed = False # invalidate D
-                        added_somewhere = True
-                    
-            # no valid upstream task: C or D
-            else:
-                # invalid upstream task and no downstream opened, continue
-                if not bug_content[target_project][False]:
-                    continue
-                link, title, status, importance, assignee =  bug_content[target_project][False]
-                if status in invalid_status_to_open_bug:
-                    continue
-                at_least_one_downstream = True
-                # C
-                if status != 'Fix Released':
-                    bug_to_add = (link, title, importance, assignee)
-                    add_to_project_bug(ready_to_develop_downstream, target_project, bug_to_add)
-                    added_somewhere = True
-                    all_downstream_closed = False # invalidate D
-        
-        # deal with D
-        if at_least_one_downstream and all_downstream_closed:
-            # assignee and importance is the design bug then
-            assignee_name = ""
-            if design_bug_task.assignee:
-                assignee_name = design_bug_task.assignee.name
-            ready_to_review[design_bug_task.web_link] = (design_bug_task.bug.title, design_bug_task.importance,
-                                                         assignee_name)
-            added_somewhere = True
-            
-        if not added_somewhere:
-            assignee_name = ""
-            if design_bug_task.assignee:
-                assignee_name = design_bug_task.assignee.name
-            bugs_in_invalid_state[design_bug_task.web_link] = (design_bug_task.bug.title, design_bug_task.importance,
-                                                                assignee_name)
-        db.ensure_not_in_db_closed_bugs(design_bug_task.web_link)
+        bug_content = get_bug_content(master_task, parent_bug)
+        (opened_projects, failed_projects) = open_missing_downstream_tasks(design_bug_task, parent_bug, bug_content)
+        triaged_bugs.append((design_bug_task, parent_bug, bug_content, opened_projects, failed_projects))
+        open_links.add(design_bug_task.web_link)
+    db.ensure_not_in_db_closed_bugs(open_links)
+
+    vectorclassifier = None
+    if len(triaged_bugs) >= vectorized_threshold:
+        # only imported when used, numpy is slow to load
+        try:
+            from unify import vectorclassifier
+        except ImportError:
+            # numpy isn't there, classify in pure python
+            pass
+    if vectorclassifier:
+        (ready_to_develop_upstream, ready_to_develop_downstream, ready_to_land_downstream, review_indexes,
+         invalid_indexes) = vectorclassifier.classify(triaged_bugs, invalid_status_to_open_bug)
+    else:
+        review_indexes = []
+        invalid_indexes = []
+        for (index, (design_bug_task, parent_bug, bug_content, opened_projects, failed_projects)) in enumerate(triaged_bugs):
+            (ready_to_review_bug, added_somewhere) = triage_bug_content(bug_content, opened_projects, failed_projects, ready_to_develop_upstream,
+                                                                        ready_to_develop_downstream, ready_to_land_downstream)
+            if ready_to_review_bug:
+                review_indexes.append(index)
+            if not added_somewhere:
+                invalid_indexes.append(index)
+
+    # assignee and importance is the design bug then
+    for (indexes, bug_dict) in ((review_indexes, ready_to_review), (invalid_indexes, bugs_in_invalid_state)):
+        for index in indexes:
+            (design_bug_task, parent_bug) = triaged_bugs[index][:2]
+            assignee_name = get_assignee_name(design_bug_task.assignee_link)
+            bug_dict[design_bug_task.web_link] = (parent_bug.title, design_bug_task.importance, assignee_name)
+
+    # unit tests only see a part of the tracker, which isn't a snapshot of it
+    if subset_bugs is None:
+        record_tracker_snapshot(master_task, db, tracker_tasks, open_links, triaged_bugs, review_indexes, invalid_indexes)
 
     return (untriaged_bugs,
             officially_signed_off,
@@ -580,32 +655,196 @@ def get_bug_mastered_track_reports(master_task, db, subset_bugs=None):
             ready_to_review,
             bugs_in_invalid_state)
 
-def get_bug_master_track_bug_status(project, bugstatus, bug_dict, db, subset_bugs):
-    """ get data for get_bug_mastered_track_reports by status and add
-    them to bug_dict"""
+def record_tracker_snapshot(master_task, db, tracker_tasks, open_links, triaged_bugs, review_indexes, invalid_indexes):
+    """ record in the status history the category and status of all open bugs of the tracker """
+    bug_states = {}
+    for (bugstatus, category) in status_categories.items():
+        for bug_task in tracker_tasks[bugstatus]:
+            # duplicates are not reported
+            if bug_task.web_link in open_links:
+                bug_states[bug_task.bug_id] = (category, bugstatus)
+    review_indexes = set(review_indexes)
+    invalid_indexes = set(invalid_indexes)
+    for (index, triaged_bug) in enumerate(triaged_bugs):
+        design_bug_task = triaged_bug[0]
+        if index in review_indexes:
+            category = "ready_to_review"
+        elif index in invalid_indexes:
+            category = "invalid"
+        else:
+            category = "in_development"
+        bug_states[design_bug_task.bug_id] = (category, design_bug_task.status)
+    db.record_tracker_snapshot(master_task, bug_states)
+
+def get_bug_content(master_task, parent_bug):
+    """ upstream and downstream tasks of parent_bug by project, other than the master task, old releases and bug watches
+
+    return a dict of project: {True: upstream task, False: downstream task}, each task
+    being (web_link, bug title, status, importance, assignee name) or None"""
+
+    bug_content = {}
+    for child_task in parent_bug.bug_tasks:
+        target_name = child_task.bug_target_name
+        # ignore the master tracking task
+        if target_name == master_task:
+            continue
+        # ignore old release status
+        target = parse_target(target_name)
+        if target.old_release:
+            continue
+        # ignore if there is a bug watch (not a real upstream bug for us to work on)
+        if child_task.bug_watch_link:
+            continue
+        (is_upstream, target_project) = (target.is_upstream, target.project)
+        if not target_project in bug_content:
+            # create upstream and downstream task to None
+            bug_content[target_project] = {True: None, False: None}
+        assignee_name = get_assignee_name(child_task.assignee_link)
+        bug_content[target_project][is_upstream] = (child_task.web_link, parent_bug.title, child_task.status, child_task.importance, assignee_name)
+    return bug_content
+
+def open_missing_downstream_tasks(design_bug_task, parent_bug, bug_content):
+    """ open a downstream task for each valid upstream one without any, and add it to bug_content
+
+    return: projects where a downstream task was opened, projects where launchpad refused to"""
+
+    opened_projects = set()
+    failed_projects = set()
+    for target_project in bug_content:
+        upstream_task = bug_content[target_project][True]
+        if not upstream_task or upstream_task[2] in invalid_status_to_open_bug or bug_content[target_project][False]:
+            continue
+        try:
+            component_to_open = launchpad.distributions['ubuntu'].getSourcePackage(name = target_project)
+            new_task = parent_bug.addTask(target=component_to_open)
+            logging.info("Adding downstream tasks for %s" % design_bug_task.web_link)
+            bug_content[target_project][False] = (new_task.web_link, parent_bug.title, new_task.status, new_task.importance, None)
+            opened_projects.add(target_project)
+        except (lazr.restfulclient.errors.HTTPError, lazr.restfulclient.errors.RestfulError, lazr.restfulclient.errors.ResponseError):
+            failed_projects.add(target_project) # this upstream doesn't count
+    return (opened_projects, failed_projects)
+
+def triage_bug_content(bug_content, opened_projects, failed_projects, ready_to_develop_upstream,
+                       ready_to_develop_downstream, ready_to_land_downstream):
+    """ add the tasks of a design bug to the ready to develop/land dicts
+
+    return: if the bug is ready for review, if it was added anywhere"""
+
+    # ok, now let's triage this. There are multiple cases:
+    # A: 1 upstream (!= fix committed, fix released), 0 or 1 downstream matching -> some work needed by upstream dev. Opening downstream task if none (if status is valid).
+    # B: 1 upstream (== fix committed or fix released), 0 or 1 downstream matching (!= fix released) -> needs to land in distro. Opening downstream task if none (if status is valid).
+    # C: 1 downstream without upstream matching (!= fix released) -> some work needed by downstream dev  
+    # D: all tasks with (0/1 upstream, all downstream (== fix released)) -> ready for review by the change design owner
+    all_downstream_closed = True
+    at_least_one_downstream = False
+    added_somewhere = False
+    for target_project in bug_content:
+        # A, B or D (valid upstream bug)
+        if bug_content[target_project][True] and bug_content[target_project][True][2] not in invalid_status_to_open_bug:
+            if target_project in failed_projects:
+                continue # this upstream doesn't count
+            if target_project in opened_projects:
+                all_downstream_closed = False # we just opened the bug, obviously not landed yet. invalidate D
+            at_least_one_downstream = True # we have at least a valid downstream bug
+            link, title, status, importance, assignee = bug_content[target_project][True]
+            # A
+            if status not in ('Fix Committed', 'Fix Released'):
+                bug_to_add = (link, title, importance, assignee)
+                add_to_project_bug(ready_to_develop_upstream, target_project, bug_to_add)
+                added_somewhere = True
+                (downstream_link, downstream_title, downstream_status, downstream_importance, downstream_assignee) = bug_content[target_project][False]
+                # Something landed upstream. Ignore invalid_status_to_open_bug as this should mean
+                # we have something downstream to land.
+                # /!\ unity, as used as a metatarget though is ignoring this exception as invalid is possible…
+                if downstream_status != 'Fix Released' and (target_project != 'unity' or downstream_status not in invalid_status_to_open_bug):
+                    all_downstream_closed = False # invalidate D
+            # B or D
+            else:
+                # Same remark as above
+                (downstream_link, downstream_title, downstream_status, downstream_importance, downstream_assignee) = bug_content[target_project][False]
+                # B
+                if downstream_status != 'Fix Released' and (target_project != 'unity' or downstream_status not in invalid_status_to_open_bug):
+                    bug_to_add = (downstream_link, downstream_title, downstream_importance, downstream_assignee)
+                    add_to_project_bug(ready_to_land_downstream, target_project, bug_to_add)
+                    all_downstream_closed = False # invalidate D
+                    added_somewhere = True
+                
+        # no valid upstream task: C or D
+        else:
+            # invalid upstream task and no downstream opened, continue
+            if not bug_content[target_project][False]:
+                continue
+            link, title, status, importance, assignee =  bug_content[target_project][False]
+            if status in invalid_status_to_open_bug:
+                continue
+            at_least_one_downstream = True
+            # C
+            if status != 'Fix Released':
+                bug_to_add = (link, title, importance, assignee)
+                add_to_project_bug(ready_to_develop_downstream, target_project, bug_to_add)
+                added_somewhere = True
+                all_downstream_closed = False # invalidate D
+    
+    # deal with D
+    ready_to_review = at_least_one_downstream and all_downstream_closed
+    return (ready_to_review, added_somewhere or ready_to_review)
+
+def get_bug_master_track_bug_status(bugs, parent_bugs, bug_dict, open_links):
+    """ get data for get_bug_mastered_track_reports for tasks of a status and add
+    them to bug_dict (and their link to open_links)"""
     
+    for bug_task in bugs:
+        parent_bug = parent_bugs[bug_task.bug_link]
+        if not parent_bug.duplicate_of:
+            assignee_name = get_assignee_name(bug_task.assignee_link)
+            bug_dict[bug_task.web_link] = (parent_bug.title, bug_task.importance, assignee_name)
+            open_links.add(bug_task.web_link)
+
+@timed('fetch')
+def get_tracker_tasks(master_task, subset_bugs=None):
+    """ fetch all tasks of the master_task tracker we report on in a single search
+
+    return a dict of status: [TaskRecords]"""
+
     if subset_bugs:
-        bugs = searchTasks_forstatus_in_reduce_scope(project.name, subset_bugs, bugstatus)
+        bugs = searchTasks_forstatus_in_reduce_scope(master_task, subset_bugs, tracker_statuses)
     else:
-        bugs = project.searchTasks(status=bugstatus)
+        bugs = launchpad.projects[master_task].searchTasks(status=tracker_statuses)
+    tasks_by_status = dict((status, []) for status in tracker_statuses)
     for bug_task in bugs:
-        if not bug_task.bug.duplicate_of:
-            assignee_name = ""
-            if bug_task.assignee:
-                assignee_name = bug_task.assignee.name
-            bug_dict[bug_task.web_link] = (bug_task.bug.title, bug_task.importance, assignee_name)
-            db.ensure_not_in_db_closed_bugs(bug_task.web_link)
+        bug_task = snapshot_task(None, bug_task, get_id_from_link(bug_task.bug_link))
+        tasks_by_status.setdefault(bug_task.status, []).append(bug_task)
+    return tasks_by_status
+        
+def get_assignee_name(assignee_link):
+    """ get the launchpad name of an assignee, empty if there is none """
+    if not assignee_link:
+        return ""
+    return get_person_cache().get_name(assignee_link)
         
+@timed('fetch')
 def log_newly_closed_bugs(master_task, db, subset_bugs=None):
-    """ log in the database all closed bugs since latest run to have stats """
-    fix_released_bugs = {}
-    project = launchpad.projects[master_task]
+    """ log in the database all closed bugs since latest run to have stats
+
+    Only closed tasks modified since the previous run are searched, all of them the first time."""
+    if subset_bugs:
+        bugs = searchTasks_forstatus_in_reduce_scope(master_task, subset_bugs, ("Fix Released",))
+    else:
+        # take the mark before searching so that we don't miss anything closed meanwhile
+        search_start = datetime.datetime.utcnow().isoformat()
+        last_search = db.get_last_closed_search(master_task)
+        if last_search:
+            bugs = launchpad.projects[master_task].searchTasks(status="Fix Released", modified_since=last_search)
+        else:
+            bugs = launchpad.projects[master_task].searchTasks(status="Fix Released")
+    bugs = [snapshot_task(None, bug_task, get_id_from_link(bug_task.bug_link)) for bug_task in bugs]
+    parent_bugs = prefetch_bugs([closed_design_bug_task.bug_link for closed_design_bug_task in bugs], with_tasks=False)
+    reports = [(closed_design_bug_task.web_link, parent_bugs[closed_design_bug_task.bug_link].title) for closed_design_bug_task in bugs]
     if subset_bugs:
-        bugs = searchTasks_forstatus_in_reduce_scope(project.name, subset_bugs, "Fix Released")
+        for (bug_link, title) in reports:
+            db.add_closed_reports(bug_link, title)
     else:
-        bugs = project.searchTasks(status="Fix Released")
-    for closed_design_bug_task in bugs:
-        db.add_closed_reports(closed_design_bug_task.web_link, closed_design_bug_task.bug.title)
+        db.add_closed_search(master_task, reports, search_start)
         
 def add_to_project_bug(bugs, target_project, bug_to_add):
     """Add (and create if needed) to a set of bug for a project"""
@@ -615,11 +854,11 @@ def add_to_project_bug(bugs, target_project, bug_to_add):
         bugs[target_project] = set()
         bugs[target_project].add(bug_to_add)
     
-def searchTasks_forstatus_in_reduce_scope(bug_target_name, bugs, status):
+def searchTasks_forstatus_in_reduce_scope(bug_target_name, bugs, statuses):
     """Fake searchTask on a reduce scope"""
     
     result = []
     for bug_task in bugs:
-        if bug_task.status == status and bug_task.bug_target_name == bug_target_name:
+        if bug_task.status in statuses and bug_task.bug_target_name == bug_target_name:
            result.append(bug_task) 
     return result
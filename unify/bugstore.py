@@ -0,0 +1,277 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import logging
+import os
+import re
+import sqlite3
+
+from unify import launchpadmanager
+from unify.metrics import get_metrics, timed
+from unify.threadpool import parallel_map
+launchpad = launchpadmanager.getLaunchpad()
+
+# number of concurrent launchpad fetches when prefetching bugs
+prefetch_workers = 8
+# how often the mirrored open bugs of a target are checked against the full launchpad list
+revalidate_interval = datetime.timedelta(days=1)
+
+# what searchTasks() returns when no status is given
+open_statuses = ("New", "Incomplete", "Confirmed", "Triaged", "In Progress", "Fix Committed")
+all_statuses = ("New", "Incomplete", "Opinion", "Invalid", "Won't Fix", "Expired", "Confirmed", "Triaged", "In Progress", "Fix Committed", "Fix Released")
+
+def get_id_from_link(link):
+    """ return the trailing id of a launchpad link, None if no link """
+    if not link:
+        return None
+    return int(re.search("(.*)/([0-9]+)$", link).group(2))
+
+
+class TaskRecord(object):
+    """ local copy of a bug task, built once from what launchpad sent
+
+    Reading it never hits the network. Only status and importance are ever
+    changed, by the write queue when it queues their save. They are changed in
+    place rather than in an updated copy because the same record is shared by
+    all passes of a sync run (see bugshandler.BugSession) and by the bugs of
+    each project, which all have to see the new values."""
+
+    __slots__ = ('store', 'self_link', 'bug_id', 'bug_target_name', 'status', 'importance',
+                 'assignee_link', 'web_link', 'bug_watch_link', 'bug_link')
+
+    def __init__(self, store, self_link, bug_id, bug_target_name, status, importance,
+                 assignee_link=None, web_link=None, bug_watch_link=None, bug_link=None):
+        self.store = store
+        self.self_link = self_link
+        self.bug_id = bug_id
+        self.bug_target_name = bug_target_name
+        self.status = status
+        self.importance = importance
+        self.assignee_link = assignee_link
+        self.web_link = web_link
+        self.bug_watch_link = bug_watch_link
+        self.bug_link = bug_link
+
+    def __repr__(self):
+        return "<TaskRecord %s: %s>" % (self.bug_target_name, self.status)
+
+
+class BugRecord(object):
+    """ local copy of a bug with all its tasks, only tasks opened by us are added to it
+
+    Opened tasks (or their placeholders in a sync plan) are appended in place,
+    so that the next passes sharing this record see them."""
+
+    __slots__ = ('store', 'id', 'title', 'duplicate_of', 'tags', 'self_link', 'bug_tasks')
+
+    def __init__(self, store, bug_id, title, duplicate_of, tags, self_link, bug_tasks=None):
+        self.store = store
+        self.id = bug_id
+        self.title = title
+        self.duplicate_of = duplicate_of
+        self.tags = tags
+        self.self_link = self_link
+        self.bug_tasks = bug_tasks or []
+
+    def addTask(self, target):
+        """ open a new task on launchpad and record it in the mirror """
+        entry = launchpad.load(self.self_link)
+        new_task = snapshot_task(self.store, entry.addTask(target=target), self.id)
+        self.bug_tasks.append(new_task)
+        if self.store:
+            self.store.save_task(new_task)
+        return new_task
+
+    def __repr__(self):
+        return "<BugRecord %s>" % self.id
+
+
+def snapshot_task(store, bug_task, bug_id):
+    """ build a TaskRecord from a launchpad bug task """
+    return TaskRecord(store, bug_task.self_link, bug_id, bug_task.bug_target_name,
+                      bug_task.status, bug_task.importance, bug_task.assignee_link,
+                      bug_task.web_link, bug_task.bug_watch_link, bug_task.bug_link)
+
+def snapshot_bug(store, bug, with_tasks=True):
+    """ build a BugRecord and all its TaskRecords from a launchpad bug """
+    bug_tasks = []
+    if with_tasks:
+        bug_tasks = [snapshot_task(store, bug_task, bug.id) for bug_task in bug.bug_tasks]
+    return BugRecord(store, bug.id, bug.title, get_id_from_link(bug.duplicate_of_link),
+                     tuple(bug.tags), bug.self_link, bug_tasks)
+
+@timed('fetch')
+def prefetch_bugs(bug_links, store=None, with_tasks=True):
+    """ fetch in parallel all bugs from bug_links with their tasks and tags
+
+    return a dict of bug_link: BugRecord. with_tasks=False only fetches the
+    bugs themselves (title, duplicate, tags)"""
+
+    def fetch(bug_link):
+        client = launchpadmanager.borrowLaunchpad()
+        try:
+            return snapshot_bug(store, client.load(bug_link), with_tasks)
+        finally:
+            launchpadmanager.returnLaunchpad(client)
+
+    bug_links = list(set(bug_links))
+    return dict(zip(bug_links, parallel_map(fetch, bug_links, prefetch_workers)))
+
+
+class BugStore():
+    """ local sqlite mirror of the launchpad bugs we sync
+
+    Only bugs modified since the last refresh of a target are fetched again
+    from launchpad."""
+
+    def __init__(self, store_path):
+
+        if not store_path:
+            store_path = os.path.join(os.path.abspath('.'), 'database', 'bugs_mirror.sql')
+
+        try:
+            os.mkdir(os.path.dirname(store_path))
+        except OSError:
+            pass
+
+        self.conn = sqlite3.connect(store_path)
+        self.db = self.conn.cursor()
+        # bugs fetched from launchpad during this run, others are served from the mirror only
+        self.refreshed = set()
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS bugs (id INTEGER PRIMARY KEY, title TEXT, duplicate_of INTEGER,
+                                             tags TEXT, self_link TEXT);
+            CREATE TABLE IF NOT EXISTS tasks (self_link TEXT PRIMARY KEY, bug_id INTEGER, bug_target_name TEXT,
+                                              status TEXT, importance TEXT, assignee_link TEXT,
+                                              web_link TEXT, bug_watch_link TEXT);
+            CREATE INDEX IF NOT EXISTS tasks_bug_id ON tasks (bug_id);
+            CREATE INDEX IF NOT EXISTS tasks_target ON tasks (bug_target_name);
+            CREATE TABLE IF NOT EXISTS sync_marks (target TEXT PRIMARY KEY, last_sync TEXT);
+            CREATE TABLE IF NOT EXISTS check_marks (target TEXT PRIMARY KEY, last_check TEXT);
+        ''')
+
+    def get_last_sync(self, target_name):
+        """ return the last time target_name was refreshed, None if never """
+        for line in self.db.execute("SELECT last_sync FROM sync_marks WHERE target=?", (target_name,)):
+            return line[0]
+        return None
+
+    def revalidation_due(self, target_name, now):
+        """ return True if the open bugs of target_name weren't checked for revalidate_interval """
+        for line in self.db.execute("SELECT last_check FROM check_marks WHERE target=?", (target_name,)):
+            return datetime.datetime.strptime(line[0][:19], '%Y-%m-%dT%H:%M:%S') + revalidate_interval < now
+        return True
+
+    def reset(self):
+        """ drop the whole mirror to force a full refresh of every target """
+        for table in ('bugs', 'tasks', 'sync_marks', 'check_marks'):
+            self.db.execute("DELETE FROM %s" % table)
+        self.conn.commit()
+
+    def refresh_target(self, target_name, target):
+        """ mirror all bugs of target modified since last refresh
+
+        A task deleted or moved to another target isn't returned by the search of
+        modified ones. Finding them needs the list of all open tasks, so it's only
+        done every revalidate_interval: until then, such a bug stays in the mirror."""
+
+        # take the mark before searching so that we don't miss anything changed meanwhile
+        now = datetime.datetime.utcnow()
+        sync_start = now.isoformat()
+        last_sync = self.get_last_sync(target_name)
+        if last_sync:
+            # we need closed ones and duplicates as well to drop them from the open scope
+            bug_tasks = target.searchTasks(status=all_statuses, modified_since=last_sync, omit_duplicates=False)
+            bug_links = [bug_task.bug_link for bug_task in bug_tasks]
+            if self.revalidation_due(target_name, now):
+                # fetch again the bugs we still believe open here and that launchpad doesn't list
+                open_links = set(bug_task.bug_link for bug_task in target.searchTasks())
+                bug_links.extend(link for link in self.get_open_links_for_target(target_name) if link not in open_links)
+                self.db.execute("INSERT OR REPLACE INTO check_marks (target, last_check) VALUES (?, ?)", (target_name, sync_start))
+        else:
+            bug_links = [bug_task.bug_link for bug_task in target.searchTasks()]
+            self.db.execute("INSERT OR REPLACE INTO check_marks (target, last_check) VALUES (?, ?)", (target_name, sync_start))
+
+        bugs = prefetch_bugs(bug_links, self)
+        for bug in bugs.values():
+            self.save_bug(bug)
+            self.refreshed.add(bug.id)
+        logging.debug("Refreshed %s bugs for %s" % (len(bugs), target_name))
+
+        self.db.execute("INSERT OR REPLACE INTO sync_marks (target, last_sync) VALUES (?, ?)", (target_name, sync_start))
+        self.conn.commit()
+
+    def save_bug(self, bug):
+        """ replace the bug and all its tasks in the mirror """
+        self.db.execute("INSERT OR REPLACE INTO bugs (id, title, duplicate_of, tags, self_link) VALUES (?, ?, ?, ?, ?)",
+                        (bug.id, bug.title, bug.duplicate_of, " ".join(bug.tags), bug.self_link))
+        self.db.execute("DELETE FROM tasks WHERE bug_id=?", (bug.id,))
+        for bug_task in bug.bug_tasks:
+            self.save_task(bug_task, commit=False)
+
+    def save_task(self, bug_task, commit=True):
+        """ insert or update a single task """
+        self.db.execute("INSERT OR REPLACE INTO tasks (self_link, bug_id, bug_target_name, status, importance, assignee_link, web_link, bug_watch_link) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (bug_task.self_link, bug_task.bug_id, bug_task.bug_target_name, bug_task.status,
+                         bug_task.importance, bug_task.assignee_link, bug_task.web_link, bug_task.bug_watch_link))
+        if commit:
+            self.conn.commit()
+
+    def get_bugs(self, bug_ids):
+        """ return a dict of bug_id: BugRecord for those ids """
+        bugs = {}
+        for bug_id in bug_ids:
+            for (bug_id, title, duplicate_of, tags, self_link) in self.db.execute("SELECT id, title, duplicate_of, tags, self_link FROM bugs WHERE id=?", (bug_id,)):
+                tags = tags and tuple(tags.split(" ")) or ()
+                bugs[bug_id] = BugRecord(self, bug_id, title, duplicate_of, tags, self_link)
+                get_metrics().count_cache('bug_store', bug_id not in self.refreshed)
+        for bug_id in bugs:
+            for line in self.db.execute("SELECT self_link, bug_id, bug_target_name, status, importance, assignee_link, web_link, bug_watch_link FROM tasks WHERE bug_id=?", (bug_id,)):
+                bugs[bug_id].bug_tasks.append(TaskRecord(self, *line, bug_link=bugs[bug_id].self_link))
+        return bugs
+
+    def get_open_bugs_for_targets(self, target_names):
+        """ return a dict of bug_id: BugRecord having an open task on one of target_names
+
+        duplicates are left out, as launchpad does when searching tasks"""
+        query = "SELECT DISTINCT bug_id FROM tasks JOIN bugs ON bugs.id = tasks.bug_id WHERE duplicate_of IS NULL AND bug_target_name IN (%s) AND status IN (%s)" % (
+            ", ".join("?" * len(target_names)), ", ".join("?" * len(open_statuses)))
+        bug_ids = [line[0] for line in self.db.execute(query, tuple(target_names) + open_statuses)]
+        return self.get_bugs(bug_ids)
+
+    def get_open_links_for_target(self, target_name):
+        """ return the links of the mirrored bugs having an open task on target_name, duplicates left out """
+        query = "SELECT DISTINCT bugs.self_link FROM tasks JOIN bugs ON bugs.id = tasks.bug_id WHERE duplicate_of IS NULL AND bug_target_name=? AND status IN (%s)" % (
+            ", ".join("?" * len(open_statuses)))
+        return [line[0] for line in self.db.execute(query, (target_name,) + open_statuses)]
+
+    def close(self):
+        """ close the mirror """
+        self.conn.commit()
+        self.db.close()
+        self.db = None
+
+
+# singleton
+bug_store = None
+def get_bug_store(store_path=None):
+    global bug_store
+    if not bug_store or not bug_store.db:
+        bug_store = BugStore(store_path)
+    return bug_store
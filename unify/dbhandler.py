@@ -16,10 +16,84 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import collections
+import datetime
+import logging
 import os
+import Queue
 import sqlite3
+import sys
+import threading
+import time
 
-class DBHandler():
+from unify.metrics import get_metrics, timed
+from unify.releases import get_releases
+
+# schema versions: each script brings a database from the previous version to its own
+# (tables of databases created before versioning may already be there)
+migrations = (
+    # 1: closed bugs and last searches for them
+    '''
+    CREATE TABLE IF NOT EXISTS closed_design_bugs (link VARCHAR(80) PRIMARY KEY, title VARCHAR(80), release VARCHAR(10));
+    CREATE TABLE IF NOT EXISTS closed_marks (master_task VARCHAR(80) PRIMARY KEY, last_search VARCHAR(30));
+    ''',
+    # 2: status history, a row per run and tracked bug with names coded as labels,
+    # and the per day and time in state rollups maintained when recording a run
+    '''
+    CREATE TABLE IF NOT EXISTS labels (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+    CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, started REAL, day TEXT);
+    CREATE TABLE IF NOT EXISTS bug_snapshots (run_id INTEGER, tracker_id INTEGER, bug_id INTEGER,
+                                              category_id INTEGER, status_id INTEGER,
+                                              PRIMARY KEY (run_id, tracker_id, bug_id));
+    CREATE TABLE IF NOT EXISTS category_counts (tracker_id INTEGER, day TEXT, category_id INTEGER, count INTEGER,
+                                                PRIMARY KEY (tracker_id, day, category_id));
+    CREATE TABLE IF NOT EXISTS bug_states (tracker_id INTEGER, bug_id INTEGER, category_id INTEGER,
+                                           status_id INTEGER, since REAL, PRIMARY KEY (tracker_id, bug_id));
+    CREATE TABLE IF NOT EXISTS state_durations (tracker_id INTEGER, category_id INTEGER, bug_count INTEGER,
+                                                total_seconds REAL, PRIMARY KEY (tracker_id, category_id));
+    ''',
+    # 3: closed bugs keyed by an integer, links and releases indexed
+    '''
+    CREATE TABLE closed_design_bugs_v3 (id INTEGER PRIMARY KEY, link TEXT NOT NULL, title TEXT, release TEXT);
+    INSERT INTO closed_design_bugs_v3 (link, title, release) SELECT link, title, release FROM closed_design_bugs;
+    DROP TABLE closed_design_bugs;
+    ALTER TABLE closed_design_bugs_v3 RENAME TO closed_design_bugs;
+    CREATE UNIQUE INDEX closed_design_bugs_link ON closed_design_bugs (link);
+    CREATE INDEX closed_design_bugs_release ON closed_design_bugs (release);
+    ''',
+)
+
+# write ahead log so that readers don't block the writer nor each other,
+# and a durable enough sync for data we can fetch again from launchpad
+pragmas = ('journal_mode=WAL', 'synchronous=NORMAL', 'cache_size=-8000', 'temp_store=MEMORY')
+
+# the writer thread commits queued writes at least that often (in seconds), or every write_batch of them
+write_delay = 0.5
+write_batch = 1000
+
+def connect(db_path, check_same_thread=True):
+    """ open a tuned connection to db_path """
+    db_conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
+    db_conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        db_conn.execute('PRAGMA %s' % pragma)
+    return db_conn
+
+def migrate(db_conn):
+    """ bring the database schema to the latest version """
+    version = db_conn.execute('PRAGMA user_version').fetchone()[0]
+    for (new_version, script) in enumerate(migrations[version:], version + 1):
+        # one transaction per version
+        db_conn.executescript('BEGIN; %s PRAGMA user_version=%d; COMMIT;' % (script, new_version))
+
+
+class DBHandler(object):
+    """ designify database, written by a single writer thread
+
+    Writes can be queued from any thread. The writer groups them in a transaction
+    every write_delay seconds (or write_batch operations). Reads are done on a
+    connection of the calling thread, once all writes queued before are committed.
+    Errors of rolled back writes are only raised by flush() and close_db()."""
 
     def __init__(self, db_path):
     
@@ -31,29 +105,237 @@ class DBHandler():
         except OSError:
             pass
             
-        db_conn = sqlite3.connect(db_path)
-        db_conn.row_factory = sqlite3.Row
-        self.db = db_conn.cursor()
-        self.current_release = 'Raring'
-        
-        try:
-            self.db.execute('CREATE TABLE closed_design_bugs (link VARCHAR(80) PRIMARY KEY, title VARCHAR(80), release VARCHAR(10));')
-        except sqlite3.OperationalError:
-            pass
+        self.db_path = db_path
+        db_conn = connect(db_path)
+        migrate(db_conn)
+        self.current_release = get_releases()[0]
+        self.labels = self.load_labels(db_conn)
+        db_conn.close()
+        self.run_id = None
+        self.closed = False
+        self.errors = []
+        self.local = threading.local()
+        # reading connections of all threads, closed with the database
+        self.connections = []
+        self.lock = threading.Lock()
+        self.writes = Queue.Queue()
+        # writes queued and writes the writer is done with (committed or rolled back)
+        self.queued_writes = 0
+        self.handled_writes = 0
+        self.writer = threading.Thread(target=self.write_loop, name='db-writer')
+        self.writer.daemon = True
+        self.writer.start()
+
+    @property
+    def db(self):
+        """ cursor of the calling thread connection, None once closed
+
+        waits for the writes queued so far, if any"""
+        if self.closed:
+            return None
+        if self.handled_writes < self.queued_writes:
+            self.send_writer('flush')
+        if not hasattr(self.local, 'cursor'):
+            # closed by close_db(), from whatever thread
+            db_conn = connect(self.db_path, check_same_thread=False)
+            with self.lock:
+                self.connections.append(db_conn)
+            self.local.cursor = db_conn.cursor()
+        return self.local.cursor
+
+    def write_loop(self):
+        """ apply queued writes, a transaction for each group of them """
+        db_conn = connect(self.db_path)
+        db = db_conn.cursor()
+        while True:
+            operations = [self.writes.get()]
+            deadline = time.time() + write_delay
+            # a flush or close request ends the group
+            while len(operations) < write_batch and operations[-1][0] == 'write':
+                try:
+                    operations.append(self.writes.get(timeout=max(deadline - time.time(), 0)))
+                except Queue.Empty:
+                    break
+            try:
+                with get_metrics().phase('db_writes'):
+                    with db_conn:
+                        for (kind, payload) in operations:
+                            if kind == 'write':
+                                payload(db)
+            except Exception:
+                logging.error("Database writes of %s operations rolled back" % len(operations))
+                self.errors.append(sys.exc_info())
+                self.forget_rolled_back_ids(db)
+            with self.lock:
+                self.handled_writes += len([kind for (kind, payload) in operations if kind == 'write'])
+            for (kind, payload) in operations:
+                if kind != 'write':
+                    payload.set()
+            if operations[-1][0] == 'close':
+                db_conn.close()
+                return
+
+    def queue_write(self, write):
+        """ queue write(cursor) to be run by the writer thread """
+        with self.lock:
+            self.queued_writes += 1
+        self.writes.put(('write', write))
+
+    def send_writer(self, kind):
+        """ wait for the writer to handle a 'flush' or 'close' request, after all writes queued so far """
+        done = threading.Event()
+        self.writes.put((kind, done))
+        done.wait()
+
+    def wait_writer(self, kind):
+        """ send_writer(), then raise the first error of a rolled back write group, if any """
+        self.send_writer(kind)
+        if self.errors:
+            (error_type, error, traceback) = self.errors.pop(0)
+            raise error_type, error, traceback
 
-    def ensure_not_in_db_closed_bugs(self, bug_link):
-        """reopen a previously closed bugs"""
-        self.db.execute("DELETE from closed_design_bugs where link='%s'" % bug_link)
+    def flush(self):
+        """ wait for all writes queued so far to be committed
+
+        raise the first error of a rolled back write group, if any"""
+        self.wait_writer('flush')
+
+    @timed('db')
+    def ensure_not_in_db_closed_bugs(self, bug_links):
+        """reopen previously closed bugs, bug_links being a link or a collection of them"""
+        if isinstance(bug_links, basestring):
+            bug_links = (bug_links,)
+        bug_links = tuple(bug_links)
+        def write(db):
+            db.executemany("DELETE from closed_design_bugs where link=?", ((bug_link,) for bug_link in bug_links))
+        self.queue_write(write)
         
+    @timed('db')
     def add_closed_reports(self, bug_link, title, release=None):
         """add a new bug to the dance"""
         if not release:
             release = self.current_release
+        def write(db):
+            self.insert_closed_report(db, bug_link, title, release)
+        self.queue_write(write)
+
+    def insert_closed_report(self, db, bug_link, title, release):
+        """insert a closed bug if not there yet (writer thread only)"""
         try:
-            self.db.execute("INSERT into closed_design_bugs (link, title, release) VALUES (?, ?, ?)", (bug_link, title, release))
+            db.execute("INSERT into closed_design_bugs (link, title, release) VALUES (?, ?, ?)", (bug_link, title, release))
         except sqlite3.IntegrityError:
             pass # don't add the same bug twice
             
+    @timed('db')
+    def get_last_closed_search(self, master_task):
+        """return the last time closed bugs of master_task were searched, None if never"""
+        for line in self.db.execute("SELECT last_search from closed_marks where master_task=?", (master_task,)):
+            return line[0]
+        return None
+
+    @timed('db')
+    def add_closed_search(self, master_task, reports, last_search):
+        """add the (link, title) closed bugs found searching master_task and remember when it was searched
+
+        both are committed in the same transaction, so that no closed bug is missed if it's rolled back"""
+        release = self.current_release
+        def write(db):
+            for (bug_link, title) in reports:
+                self.insert_closed_report(db, bug_link, title, release)
+            db.execute("INSERT OR REPLACE into closed_marks (master_task, last_search) VALUES (?, ?)", (master_task, last_search))
+        self.queue_write(write)
+
+    def load_labels(self, db):
+        """name: id of all labels in the database"""
+        return dict((name, label_id) for (label_id, name) in db.execute("SELECT id, name from labels"))
+
+    def forget_rolled_back_ids(self, db):
+        """drop the label and run ids created by a rolled back transaction (writer thread only)"""
+        self.labels = self.load_labels(db)
+        if self.run_id and not db.execute("SELECT 1 from runs WHERE id=?", (self.run_id,)).fetchone():
+            self.run_id = None
+
+    def get_label_id(self, db, name):
+        """integer code of a tracker, category or status name (writer thread only)"""
+        if name not in self.labels:
+            db.execute("INSERT into labels (name) VALUES (?)", (name,))
+            self.labels[name] = db.lastrowid
+        return self.labels[name]
+
+    def get_run_id(self, db):
+        """id of the current run, created with its first snapshot (writer thread only)"""
+        if not self.run_id:
+            started = time.time()
+            self.run_day = datetime.datetime.utcfromtimestamp(started).date().isoformat()
+            db.execute("INSERT into runs (started, day) VALUES (?, ?)", (started, self.run_day))
+            self.run_id = db.lastrowid
+        return self.run_id
+
+    @timed('db')
+    def record_tracker_snapshot(self, tracker, bug_states):
+        """record the category and status of every open bug of tracker in this run
+
+        bug_states is a dict of bug_id: (category, status). The counts per category of
+        the day (the last run of a day wins) and the time spent by bugs in a category
+        they just left are updated at the same time."""
+        now = time.time()
+        bug_states = dict(bug_states)
+        def write(db):
+            run_id = self.get_run_id(db)
+            day = self.run_day
+            tracker_id = self.get_label_id(db, tracker)
+            current = dict((bug_id, (self.get_label_id(db, category), self.get_label_id(db, status)))
+                           for (bug_id, (category, status)) in bug_states.items())
+            db.executemany("INSERT OR REPLACE into bug_snapshots (run_id, tracker_id, bug_id, category_id, status_id) VALUES (?, ?, ?, ?, ?)",
+                           ((run_id, tracker_id, bug_id, category_id, status_id) for (bug_id, (category_id, status_id)) in current.items()))
+
+            counts = collections.Counter(category_id for (category_id, status_id) in current.values())
+            db.execute("DELETE from category_counts where tracker_id=? and day=?", (tracker_id, day))
+            db.executemany("INSERT into category_counts (tracker_id, day, category_id, count) VALUES (?, ?, ?, ?)",
+                           ((tracker_id, day, category_id, count) for (category_id, count) in counts.items()))
+
+            # close the states bugs left (to another category or out of the open bugs)
+            durations = {}
+            previous = {}
+            for (bug_id, category_id, since) in db.execute("SELECT bug_id, category_id, since from bug_states where tracker_id=?", (tracker_id,)).fetchall():
+                previous[bug_id] = category_id
+                if bug_id not in current or current[bug_id][0] != category_id:
+                    (bug_count, total_seconds) = durations.get(category_id, (0, 0))
+                    durations[category_id] = (bug_count + 1, total_seconds + now - since)
+            for (category_id, (bug_count, total_seconds)) in durations.items():
+                db.execute("INSERT OR IGNORE into state_durations (tracker_id, category_id, bug_count, total_seconds) VALUES (?, ?, 0, 0)",
+                           (tracker_id, category_id))
+                db.execute("UPDATE state_durations SET bug_count=bug_count+?, total_seconds=total_seconds+? where tracker_id=? and category_id=?",
+                           (bug_count, total_seconds, tracker_id, category_id))
+            db.executemany("DELETE from bug_states where tracker_id=? and bug_id=?",
+                           ((tracker_id, bug_id) for bug_id in previous if bug_id not in current))
+            db.executemany("INSERT OR REPLACE into bug_states (tracker_id, bug_id, category_id, status_id, since) VALUES (?, ?, ?, ?, ?)",
+                           ((tracker_id, bug_id, category_id, status_id, now) for (bug_id, (category_id, status_id)) in current.items()
+                            if previous.get(bug_id) != category_id))
+            db.executemany("UPDATE bug_states SET status_id=? where tracker_id=? and bug_id=?",
+                           ((status_id, tracker_id, bug_id) for (bug_id, (category_id, status_id)) in current.items()
+                            if previous.get(bug_id) == category_id))
+        self.queue_write(write)
+
+    @timed('db')
+    def get_category_counts(self, tracker):
+        """number of open bugs of tracker by day and category, as a list of (day, category, count) by day"""
+        db = self.db
+        names = dict((label_id, name) for (name, label_id) in self.labels.items())
+        return [(day, names[category_id], count) for (day, category_id, count) in
+                db.execute("SELECT day, category_id, count from category_counts where tracker_id=? ORDER BY day",
+                           (self.labels.get(tracker),))]
+
+    @timed('db')
+    def get_time_in_state(self, tracker):
+        """bugs of tracker which left a category, by category: (number of bugs, average seconds they stayed in it)"""
+        db = self.db
+        names = dict((label_id, name) for (name, label_id) in self.labels.items())
+        return dict((names[category_id], (bug_count, total_seconds / bug_count)) for (category_id, bug_count, total_seconds) in
+                    db.execute("SELECT category_id, bug_count, total_seconds from state_durations where tracker_id=? and bug_count > 0",
+                               (self.labels.get(tracker),)))
+
+    @timed('db')
     def get_closed_reports_by_release(self):
         """Get closed reports by release"""
         results = self.db.execute("SELECT release, COUNT(*) from closed_design_bugs GROUP BY release")
@@ -62,18 +344,26 @@ class DBHandler():
             result_by_release[line[0]] = line[1]
         return result_by_release
     
+    @timed('db')
     def close_db(self):
-        """close db"""
-        self.db.connection.commit()
-        self.db.close()
-        self.db = None
+        """commit all queued writes and close db"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.wait_writer('close')
+        finally:
+            with self.lock:
+                for db_conn in self.connections:
+                    db_conn.close()
+                self.connections = []
         
 
 # singleton
 db_handler = None
 def get_db_handler(dbpath=None):
     global db_handler
-    if not db_handler or not db_handler.db:
+    if not db_handler or db_handler.closed:
         db_handler = DBHandler(dbpath)
     return db_handler
     
@@ -16,21 +16,63 @@
 
 from __future__ import absolute_import, unicode_literals
 import os
+import Queue
 
-from launchpadlib.launchpad import Launchpad
-launchpad = None
+from unify.metrics import get_metrics
 
-def getLaunchpad(use_staging=False):
-    '''Get THE Launchpad'''
-    global launchpad
-    if not launchpad:
-        if use_staging:
-            server = 'staging'
-        else:
-            server = 'production'
-        lp_dir = os.path.join(os.path.dirname(__file__), '..', 'lplib')
-        launchpad = Launchpad.login_with('unify', server, os.path.join(lp_dir, 'cache'), allow_access_levels=["WRITE_PRIVATE"], credentials_file=os.path.join(lp_dir, 'cred'))
+class LazyLaunchpad(object):
+    '''Launchpad handle only logging in on first real use'''
+
+    def __init__(self):
+        self.server = 'production'
+        self.client = None
+        self.injected = False
+
+    def __getattr__(self, name):
+        # only called for what isn't an attribute of the handle itself
+        return getattr(self.connect(), name)
+
+    def connect(self):
+        '''Get the logged in Launchpad instance'''
+        if not self.client:
+            self.client = login(self.server)
+        return self.client
+
+launchpad = LazyLaunchpad()
+# extra logged in instances for worker threads, a launchpadlib instance can't be shared between threads
+client_pool = Queue.Queue()
 
+def login(server):
+    '''Log in to server with our credentials'''
+    from launchpadlib.launchpad import Launchpad
+    lp_dir = os.path.join(os.path.dirname(__file__), '..', 'lplib')
+    client = Launchpad.login_with('unify', server, os.path.join(lp_dir, 'cache'), allow_access_levels=["WRITE_PRIVATE"], credentials_file=os.path.join(lp_dir, 'cred'))
+    get_metrics().instrument(client._browser)
+    return client
+
+def getLaunchpad(use_staging=False):
+    '''Get THE Launchpad (logging in is deferred until it's used)'''
+    if use_staging and not launchpad.client:
+        launchpad.server = 'staging'
     return launchpad
 
+def setLaunchpad(client):
+    '''Use client (a fake one for instance) instead of logging in'''
+    launchpad.client = client
+    launchpad.injected = client is not None
+
+def borrowLaunchpad():
+    '''Get a Launchpad instance for the current thread only, to give back with returnLaunchpad()'''
+    if launchpad.injected:
+        return launchpad.client
+    try:
+        return client_pool.get_nowait()
+    except Queue.Empty:
+        return login(launchpad.server)
+
+def returnLaunchpad(client):
+    '''Give back a Launchpad instance from borrowLaunchpad()'''
+    if launchpad.injected:
+        return
+    client_pool.put(client)
 
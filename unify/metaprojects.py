@@ -0,0 +1,102 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+'''Meta projects (like unity) and the upstream and downstream targets they sync'''
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import ConfigParser
+
+from unify import unifyconfig
+from unify.releases import get_synced_series
+from unify.targets import parse_target
+
+# (upstream filter, downstream filter): their targets index, see get_target_index()
+target_indexes = {}
+
+class ProjectFilter(tuple):
+    """ project or target names, in their configuration order, with constant time membership tests """
+
+    def __new__(cls, names):
+        project_filter = tuple.__new__(cls, names)
+        project_filter.names = frozenset(project_filter)
+        return project_filter
+
+    def __contains__(self, name):
+        return name in self.names
+
+
+def get_target_index(upstream_filter, downstream_filter):
+    """ dict of bug target name: (project, is_upstream) for all targets of upstream_filter and downstream_filter
+
+    built once for each pair of filters, when loading the meta project they belong to"""
+    key = (tuple(upstream_filter), tuple(downstream_filter))
+    try:
+        return target_indexes[key]
+    except KeyError:
+        pass
+    index = {}
+    for bug_target_name in key[0] + key[1]:
+        target = parse_target(bug_target_name)
+        index[bug_target_name] = (target.project, target.is_upstream)
+    target_indexes[key] = index
+    return index
+
+
+class MetaProject():
+    """ a meta project with its upstream projects and its downstream only packages
+
+    downstream_filter has the development and synced series targets of all
+    of them, like "nux (Ubuntu)" and "nux (Ubuntu Raring)". targets indexes
+    the project and role of all targets of both filters."""
+
+    def __init__(self, name, upstream_projects, downstream_only, series):
+        self.name = name
+        self.upstream_filter = ProjectFilter(upstream_projects)
+        self.downstream_only = ProjectFilter(downstream_only)
+        self.series = tuple(series)
+        downstream_filter = []
+        for project in self.upstream_filter + self.downstream_only:
+            downstream_filter.append("%s (Ubuntu)" % project)
+            for serie in self.series:
+                downstream_filter.append("%s (Ubuntu %s)" % (project, serie))
+        self.downstream_filter = ProjectFilter(downstream_filter)
+        self.targets = get_target_index(self.upstream_filter, self.downstream_filter)
+
+    def __repr__(self):
+        return "<MetaProject %s: %s>" % (self.name, ", ".join(self.upstream_filter))
+
+
+def load_meta_projects(path=None):
+    """ meta projects defined in path (data/meta-projects.conf by default), by name in file order
+
+    they all sync the series from data/releases.conf"""
+    if not path:
+        path = unifyconfig.get_data_file('meta-projects.conf')
+    parser = ConfigParser.SafeConfigParser()
+    if not parser.read(path):
+        raise IOError("Can't read meta projects definition %s" % path)
+    def get_names(section, option):
+        if not parser.has_option(section, option):
+            return ()
+        return tuple(parser.get(section, option).decode('utf-8').split())
+    series = get_synced_series()
+    meta_projects = collections.OrderedDict()
+    for section in parser.sections():
+        name = section.decode('utf-8')
+        meta_projects[name] = MetaProject(name, get_names(section, 'upstream'), get_names(section, 'downstream_only'), series)
+    return meta_projects
@@ -0,0 +1,230 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+from __future__ import absolute_import, unicode_literals
+
+import atexit
+import collections
+import datetime
+import functools
+import json
+import logging
+import os
+import re
+import resource
+import threading
+import time
+import urlparse
+
+# launchpad api path (without the version) to resource type, first match wins
+resource_patterns = ((re.compile(r'^$'), 'service_root'),
+                     (re.compile(r'^~'), 'person'),
+                     (re.compile(r'/\+bug/[0-9]+'), 'bug_task'),
+                     (re.compile(r'^bugs/[0-9]+/bug_tasks'), 'bug_tasks'),
+                     (re.compile(r'^bugs/[0-9]+'), 'bug'),
+                     (re.compile(r'/\+milestone/'), 'milestone'),
+                     (re.compile(r'/\+source/'), 'source_package'),
+                     (re.compile(r'^[^/]+$'), 'project'))
+
+def get_resource_type(url, body=None):
+    """ what kind of launchpad resource or operation url is about """
+    (scheme, netloc, path, query, fragment) = urlparse.urlsplit(url)
+    operation = urlparse.parse_qs(query).get('ws.op')
+    if not operation and isinstance(body, basestring) and 'ws.op=' in body:
+        operation = urlparse.parse_qs(body).get('ws.op')
+    if operation:
+        return operation[0]
+    # drop the api version
+    path = re.sub('^/[^/]*/?', '', path)
+    for (pattern, resource_type) in resource_patterns:
+        if pattern.search(path):
+            return resource_type
+    return 'other'
+
+
+class Phase():
+    """ time spent in a phase, minus the time spent in phases nested in it """
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        self.nested = 0
+        self.metrics.phase_stack().append(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self.start
+        stack = self.metrics.phase_stack()
+        stack.pop()
+        if stack:
+            stack[-1].nested += elapsed
+        self.metrics.add_phase(self.name, elapsed - self.nested)
+
+
+class Metrics():
+    """ where the time of a run went: phases, launchpad requests, caches and writes
+
+    A phase nested in another one is only accounted to the inner phase."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = collections.OrderedDict()
+        self.requests = {}
+        self.caches = collections.OrderedDict()
+        self.writes = collections.Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def phase_stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def phase(self, name):
+        """ context manager timing its block in the name phase """
+        return Phase(self, name)
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            (calls, total) = self.phases.get(name, (0, 0))
+            self.phases[name] = (calls + 1, total + seconds)
+
+    def count_request(self, resource_type, method, seconds):
+        with self.lock:
+            (count, total) = self.requests.get((resource_type, method), (0, 0))
+            self.requests[(resource_type, method)] = (count + 1, total + seconds)
+
+    def count_cache(self, cache_name, hit):
+        with self.lock:
+            (hits, misses) = self.caches.get(cache_name, (0, 0))
+            if hit:
+                self.caches[cache_name] = (hits + 1, misses)
+            else:
+                self.caches[cache_name] = (hits, misses + 1)
+
+    def count_write(self, result):
+        with self.lock:
+            self.writes[result] += 1
+
+    def instrument(self, browser):
+        """ count and time all http requests of a launchpadlib browser """
+        request_and_retry = browser._request_and_retry
+        def timed_request(url, method, body, headers):
+            start = time.time()
+            (response, content) = request_and_retry(url, method=method, body=body, headers=headers)
+            self.count_request(get_resource_type(url, body), method, time.time() - start)
+            if method == 'GET':
+                # httplib2 answers a 304 with the cached 200 response, only flagged as fromcache
+                self.count_cache('http', getattr(response, 'fromcache', False))
+            return (response, content)
+        browser._request_and_retry = timed_request
+
+    def to_dict(self, program):
+        """ all metrics as a json serializable dict """
+        requests = {}
+        for ((resource_type, method), (count, seconds)) in sorted(self.requests.items()):
+            requests.setdefault(resource_type, {})[method] = {'count': count, 'seconds': round(seconds, 4)}
+        caches = {}
+        for (cache_name, (hits, misses)) in self.caches.items():
+            caches[cache_name] = {'hits': hits, 'misses': misses,
+                                  'hit_ratio': round(float(hits) / (hits + misses), 4) if hits + misses else None}
+        return {'program': program,
+                'started': datetime.datetime.utcfromtimestamp(self.started).isoformat(),
+                'run_seconds': round(time.time() - self.started, 4),
+                'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                'phases': collections.OrderedDict((name, {'calls': calls, 'seconds': round(seconds, 4)})
+                                                  for (name, (calls, seconds)) in self.phases.items()),
+                'http_requests': requests,
+                'caches': caches,
+                'writes': dict(self.writes)}
+
+    def to_prometheus(self, program):
+        """ all metrics in the prometheus text format """
+        content = self.to_dict(program)
+        metrics = collections.OrderedDict()
+        def add(metric, help, labels, value):
+            labels = ','.join('%s="%s"' % (key, value) for (key, value) in [('program', program)] + labels)
+            metrics.setdefault(metric, (help, []))[1].append('%s{%s} %s' % (metric, labels, value))
+        add('unify_run_seconds', 'Wall time of the run', [], content['run_seconds'])
+        add('unify_peak_rss_kilobytes', 'Peak resident memory of the run', [], content['peak_rss_kb'])
+        for (name, phase) in content['phases'].items():
+            add('unify_phase_seconds', 'Wall time spent in a phase', [('phase', name)], phase['seconds'])
+        for (resource_type, methods) in sorted(content['http_requests'].items()):
+            for (method, request) in sorted(methods.items()):
+                labels = [('resource', resource_type), ('method', method)]
+                add('unify_http_requests', 'Launchpad http requests', labels, request['count'])
+                add('unify_http_request_seconds', 'Wall time spent in launchpad http requests', labels, request['seconds'])
+        for (cache_name, cache) in sorted(content['caches'].items()):
+            add('unify_cache_hits', 'Lookups answered by a cache', [('cache', cache_name)], cache['hits'])
+            add('unify_cache_misses', 'Lookups a cache had to fetch', [('cache', cache_name)], cache['misses'])
+        for (result, count) in sorted(content['writes'].items()):
+            add('unify_writes', 'Launchpad writes by outcome', [('result', result)], count)
+        lines = []
+        for (metric, (help, samples)) in metrics.items():
+            lines.append('# HELP %s %s' % (metric, help))
+            lines.append('# TYPE %s gauge' % metric)
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory, program):
+        """ write <program>-metrics.json and <program>-metrics.prom in directory """
+        try:
+            with open(os.path.join(directory, '%s-metrics.json' % program), 'w') as f:
+                json.dump(self.to_dict(program), f, indent=1)
+            with open(os.path.join(directory, '%s-metrics.prom' % program), 'w') as f:
+                f.write(self.to_prometheus(program))
+        except IOError, e:
+            logging.warning("Can't write metrics in %s: %s" % (directory, e))
+            return
+        logging.info("Run metrics written in %s" % directory)
+        for (name, (calls, seconds)) in self.phases.items():
+            logging.debug("%s: %.2fs" % (name, seconds))
+
+
+def timed(phase_name):
+    """ decorator accounting all calls of a function to the phase_name phase """
+    def decorator(function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with get_metrics().phase(phase_name):
+                return function(*args, **kwargs)
+        return timed_function
+    return decorator
+
+def report_at_exit(directory, program, profile_path=None):
+    """ write the metrics of the run (and a cProfile dump to profile_path) when exiting """
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    def report():
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        get_metrics().write(directory, program)
+    atexit.register(report)
+
+
+# singleton
+metrics = None
+def get_metrics():
+    global metrics
+    if not metrics:
+        metrics = Metrics()
+    return metrics
@@ -15,6 +15,8 @@
 ### END LICENSE
 
 from unify import launchpadmanager
+from unify.bugstore import prefetch_bugs
+from unify.writequeue import get_write_queue
 launchpad = launchpadmanager.getLaunchpad()
 
 import datetime
@@ -73,7 +75,7 @@ def getCompletedBugTasks(milestone):
     """ get fix commited or fix released bug tasks from project and milestone """
 
     bugs = milestone.searchTasks(status=("Fix Committed", "Fix Released"))
-    return [bug.bug for bug in bugs]
+    return prefetch_bugs([bug.bug_link for bug in bugs]).values()
 
 def moveOtherBugsToNextMilestone(current_milestone, next_milestone):
     """ move other bugs to next milestone """
@@ -81,6 +83,5 @@ def moveOtherBugsToNextMilestone(current_milestone, next_milestone):
     bugs = current_milestone.searchTasks(status=("New", "Incomplete", "Opinion", "Confirmed", "Triaged", "In Progress"))
     for bug_task in bugs:
         logging.info("Set bug to next milestone: %s" % bug_task.title)
-        bug_task.milestone = next_milestone
-        bug_task.lp_save()
+        get_write_queue().set(bug_task, milestone=next_milestone)
 
@@ -0,0 +1,81 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+from __future__ import absolute_import, unicode_literals
+
+import os
+import sqlite3
+import time
+
+from unify import launchpadmanager
+from unify.metrics import get_metrics
+launchpad = launchpadmanager.getLaunchpad()
+
+# default time to trust a cached name, in seconds
+default_ttl = 7 * 24 * 3600
+
+class PersonCache():
+    """ launchpad person names by person link, kept in memory for the run and on disk for ttl seconds """
+
+    def __init__(self, cache_path, ttl=default_ttl):
+
+        if not cache_path:
+            cache_path = os.path.join(os.path.abspath('.'), 'database', 'people.sql')
+
+        try:
+            os.mkdir(os.path.dirname(cache_path))
+        except OSError:
+            pass
+
+        self.conn = sqlite3.connect(cache_path)
+        self.db = self.conn.cursor()
+        self.ttl = ttl
+        self.names = {}
+        self.db.execute('CREATE TABLE IF NOT EXISTS people (link TEXT PRIMARY KEY, name TEXT, fetched REAL)')
+
+    def get_name(self, person_link):
+        """ get the name of the person behind person_link """
+        if person_link in self.names:
+            get_metrics().count_cache('person', True)
+            return self.names[person_link]
+        for (name, fetched) in self.db.execute("SELECT name, fetched FROM people WHERE link=?", (person_link,)):
+            if time.time() - fetched < self.ttl:
+                get_metrics().count_cache('person', True)
+                self.names[person_link] = name
+                return name
+        get_metrics().count_cache('person', False)
+        name = launchpad.load(person_link).name
+        self.names[person_link] = name
+        self.db.execute("INSERT OR REPLACE INTO people (link, name, fetched) VALUES (?, ?, ?)", (person_link, name, time.time()))
+        self.conn.commit()
+        return name
+
+    def close(self):
+        """ close the cache """
+        self.conn.commit()
+        self.db.close()
+        self.db = None
+
+
+# singleton
+person_cache = None
+def get_person_cache(cache_path=None, ttl=None):
+    global person_cache
+    if not person_cache or not person_cache.db:
+        person_cache = PersonCache(cache_path)
+    if ttl is not None:
+        person_cache.ttl = ttl
+    return person_cache
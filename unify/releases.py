@@ -0,0 +1,48 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+'''Ubuntu release names, from data/releases.conf'''
+
+from __future__ import absolute_import, unicode_literals
+
+import ConfigParser
+
+from unify import unifyconfig
+
+def load_releases(path=None):
+    """ current release and old releases defined in path (data/releases.conf by default) """
+    if not path:
+        path = unifyconfig.get_data_file('releases.conf')
+    parser = ConfigParser.SafeConfigParser()
+    if not parser.read(path):
+        raise IOError("Can't read releases definition %s" % path)
+    current_release = parser.get('releases', 'current').decode('utf-8').strip()
+    old_releases = tuple(parser.get('releases', 'old').decode('utf-8').split())
+    return (current_release, old_releases)
+
+def get_synced_series():
+    """ series whose tasks are synced along the development ones: the current one, unless it's old """
+    (current_release, old_releases) = get_releases()
+    return tuple(release for release in (current_release,) if release not in old_releases)
+
+
+# singleton
+releases = None
+def get_releases():
+    global releases
+    if not releases:
+        releases = load_releases()
+    return releases
@@ -0,0 +1,191 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+from __future__ import absolute_import, unicode_literals
+
+import datetime
+import json
+import lazr.restfulclient.errors
+import logging
+import os
+
+from unify import launchpadmanager
+from unify.bugstore import TaskRecord
+from unify.threadpool import parallel_map
+from unify.writequeue import WriteQueue, PendingWrite
+
+plan_version = 1
+# number of items applied between two saves of the progress
+chunk_size = 50
+
+class SyncPlan():
+    """ all changes a sync run would make, computed without touching launchpad
+
+    The plan can be saved as json, reviewed, then applied with apply()."""
+
+    def __init__(self):
+        self.open_tasks = []
+        self.writes = []
+        self.log_entries = []
+
+    def open_task(self, bug, project_name, is_upstream):
+        """ record a task to open and return a placeholder for it, usable by next passes """
+        if is_upstream:
+            target_name = project_name
+        else:
+            target_name = "%s (Ubuntu)" % project_name
+        key = "pending:%s:%s" % (bug.id, target_name)
+        self.open_tasks.append({'key': key, 'bug_link': bug.self_link, 'bug_id': bug.id,
+                                'project': project_name, 'is_upstream': is_upstream})
+        new_task = TaskRecord(None, key, bug.id, target_name, "New", "Undecided", bug_link=bug.self_link)
+        bug.bug_tasks.append(new_task)
+        return new_task
+
+    def log(self, message):
+        """ record an action to log rather than commit """
+        self.log_entries.append(message)
+
+    def add_writes(self, write_queue):
+        """ take all pending writes out of write_queue """
+        for write in write_queue.pending.values():
+            changes = {}
+            for field in write.changes:
+                value = write.changes[field]
+                if hasattr(value, 'self_link'):
+                    value = {'self_link': value.self_link}
+                changes[field] = value
+            self.writes.append({'self_link': write.self_link, 'changes': changes})
+        write_queue.pending.clear()
+
+    def save(self, plan_path):
+        """ write the plan as json """
+        with open(plan_path, 'w') as f:
+            json.dump({'version': plan_version,
+                       'created': datetime.datetime.utcnow().isoformat(),
+                       'open_tasks': self.open_tasks,
+                       'writes': self.writes,
+                       'log_entries': self.log_entries}, f, indent=1, sort_keys=True)
+        logging.info("Plan saved in %s: %s tasks to open, %s tasks to change, %s actions to log" %
+                     (plan_path, len(self.open_tasks), len(self.writes), len(self.log_entries)))
+
+    def apply(self, plan_path, log_function, workers=4):
+        """ apply the plan, resuming from a previous interrupted apply if any
+
+        Progress is kept next to the plan in a .progress file, one done item per line"""
+
+        progress_path = plan_path + '.progress'
+        done = set()
+        opened_links = {}
+        if os.path.exists(progress_path):
+            with open(progress_path) as f:
+                for line in f:
+                    (kind, key, value) = json.loads(line)
+                    done.add((kind, key))
+                    # tasks launchpad refused to open are journaled without a link
+                    if kind == 'open' and value:
+                        opened_links[key] = value
+            logging.info("Resuming plan, %s items already done" % len(done))
+
+        with open(progress_path, 'a') as progress:
+            def mark_done(kind, key, value=None):
+                progress.write(json.dumps((kind, key, value)) + "\n")
+                progress.flush()
+
+            # first open tasks, as some writes are on them
+            open_tasks = [open_task for open_task in self.open_tasks if ('open', open_task['key']) not in done]
+            for index in range(0, len(open_tasks), chunk_size):
+                chunk = open_tasks[index:index + chunk_size]
+                for (open_task, self_link) in zip(chunk, parallel_map(_open_task, chunk, workers)):
+                    if self_link:
+                        opened_links[open_task['key']] = self_link
+                    mark_done('open', open_task['key'], self_link)
+
+            write_queue = WriteQueue(workers)
+            failed_writes = 0
+            writes = [write for write in self.writes if ('write', write['self_link']) not in done]
+            for index in range(0, len(writes), chunk_size):
+                chunk = []
+                for write in writes[index:index + chunk_size]:
+                    self_link = opened_links.get(write['self_link'], write['self_link'])
+                    if self_link.startswith('pending:'):
+                        logging.warning("Skipping changes on %s which couldn't be opened" % self_link)
+                        continue
+                    changes = {}
+                    for field in write['changes']:
+                        value = write['changes'][field]
+                        if isinstance(value, dict):
+                            value = launchpadmanager.getLaunchpad().load(value['self_link'])
+                        changes[field] = value
+                    chunk.append((write, PendingWrite(self_link, changes)))
+                write_queue.pending.update((pending.self_link, pending) for (write, pending) in chunk)
+                results = write_queue.flush()
+                # failed writes are tried again when resuming
+                for (write, pending) in chunk:
+                    if results[pending.self_link]:
+                        mark_done('write', write['self_link'])
+                    else:
+                        failed_writes += 1
+            write_queue.report()
+
+            for message in self.log_entries:
+                if ('log', message) in done:
+                    continue
+                log_function(message)
+                mark_done('log', message)
+
+        if failed_writes:
+            logging.warning("%s changes couldn't be saved, apply the plan again to retry them" % failed_writes)
+        else:
+            os.remove(progress_path)
+
+
+def _open_task(open_task):
+    """ open a task from the plan, return its link or None if launchpad refused """
+    client = launchpadmanager.borrowLaunchpad()
+    try:
+        if open_task['is_upstream']:
+            target = client.projects[open_task['project']]
+        else:
+            target = client.distributions['ubuntu'].getSourcePackage(name=open_task['project'])
+        return client.load(open_task['bug_link']).addTask(target=target).self_link
+    except (lazr.restfulclient.errors.ServerError, lazr.restfulclient.errors.BadRequest), e:
+        logging.warning("Can't open %s: %s" % (open_task['key'], e))
+        return None
+    finally:
+        launchpadmanager.returnLaunchpad(client)
+
+def load_plan(plan_path):
+    """ load a plan saved by SyncPlan.save() """
+    with open(plan_path) as f:
+        content = json.load(f)
+    if content.get('version') != plan_version:
+        raise ValueError("%s is not a version %s plan" % (plan_path, plan_version))
+    plan = SyncPlan()
+    plan.open_tasks = content['open_tasks']
+    plan.writes = content['writes']
+    plan.log_entries = content['log_entries']
+    return plan
+
+
+# the plan being computed, if any. When set, sync passes record in it instead of changing launchpad
+current_plan = None
+def get_plan():
+    return current_plan
+
+def start_plan():
+    global current_plan
+    current_plan = SyncPlan()
+    return current_plan
@@ -0,0 +1,55 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+'''Bug target names, like "unity (Ubuntu Oneiric)", parsed once per run'''
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import re
+
+from unify.releases import get_releases
+
+# "<project> (Ubuntu[ <series>])" is a distro task, any other name an upstream one
+target_pattern = re.compile(r"(.*) \(Ubuntu(.*)\)")
+old_releases = tuple("(Ubuntu %s)" % release for release in get_releases()[1])
+
+Target = collections.namedtuple('Target', ('project', 'is_upstream', 'series', 'old_release'))
+
+# bug target name: Target, and project name: the one project string shared by all targets
+parsed_targets = {}
+projects = {}
+
+def parse_target(bug_target_name):
+    """ Target of a bug target name: its project (without the Ubuntu part), if it's an upstream task,
+    the distro series (None for upstream and current development tasks) and if it's on an old release
+
+    There are only a few dozen different targets for thousands of tasks, so parsing is cached
+    and all targets of a project share the same project string."""
+    try:
+        return parsed_targets[bug_target_name]
+    except KeyError:
+        pass
+    match = target_pattern.search(bug_target_name)
+    if match:
+        (project, is_upstream, series) = (match.group(1), False, match.group(2).strip() or None)
+    else:
+        (project, is_upstream, series) = (bug_target_name, True, None)
+    project = projects.setdefault(project, project)
+    old_release = any(old_release in bug_target_name for old_release in old_releases)
+    target = Target(project, is_upstream, series, old_release)
+    parsed_targets[bug_target_name] = target
+    return target
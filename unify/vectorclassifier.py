@@ -0,0 +1,109 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+'''Ready to develop/land/review classification of design bugs, with numpy
+
+Same rules than bugshandler.triage_bug_content(), but computed on all
+(bug, project) pairs at once. Importing this module fails without numpy.'''
+
+from __future__ import absolute_import, unicode_literals
+
+import numpy
+
+def classify(triaged_bugs, invalid_statuses):
+    """ triage all bugs of triaged_bugs, a list of (design_bug_task, parent_bug, bug_content,
+    opened_projects, failed_projects) as built by get_bug_mastered_track_reports()
+
+    return: ready to develop upstream, ready to develop downstream, ready to land downstream
+            (dicts of project: set of bugs), then the index in triaged_bugs of bugs ready to
+            review and of bugs in invalid state"""
+
+    status_codes = {}
+    def code(status):
+        return status_codes.setdefault(status, len(status_codes))
+
+    # one row per (bug, project), a missing task having the -1 status
+    bug_indexes = []
+    projects = []
+    upstream_statuses = []
+    downstream_statuses = []
+    opened = []
+    upstream_bugs = []
+    downstream_bugs = []
+    for (bug_index, (design_bug_task, parent_bug, bug_content, opened_projects, failed_projects)) in enumerate(triaged_bugs):
+        for target_project in bug_content:
+            (upstream_task, downstream_task) = (bug_content[target_project][True], bug_content[target_project][False])
+            if target_project in failed_projects:
+                # the upstream task doesn't count, and a downstream task can't be there
+                continue
+            bug_indexes.append(bug_index)
+            projects.append(target_project)
+            opened.append(target_project in opened_projects)
+            if upstream_task:
+                (link, title, status, importance, assignee) = upstream_task
+                upstream_statuses.append(code(status))
+                upstream_bugs.append((link, title, importance, assignee))
+            else:
+                upstream_statuses.append(-1)
+                upstream_bugs.append(None)
+            if downstream_task:
+                (link, title, status, importance, assignee) = downstream_task
+                downstream_statuses.append(code(status))
+                downstream_bugs.append((link, title, importance, assignee))
+            else:
+                downstream_statuses.append(-1)
+                downstream_bugs.append(None)
+
+    bug_indexes = numpy.array(bug_indexes, dtype=numpy.intp)
+    upstream_statuses = numpy.array(upstream_statuses, dtype=numpy.int16)
+    downstream_statuses = numpy.array(downstream_statuses, dtype=numpy.int16)
+    opened = numpy.array(opened, dtype=bool)
+    is_unity = numpy.array([project == 'unity' for project in projects], dtype=bool)
+    invalid_codes = [code(invalid_status) for invalid_status in invalid_statuses]
+    fix_committed = code('Fix Committed')
+    fix_released = code('Fix Released')
+
+    has_upstream = upstream_statuses >= 0
+    has_downstream = downstream_statuses >= 0
+    upstream_valid = has_upstream & ~numpy.in1d(upstream_statuses, invalid_codes)
+    upstream_landed = (upstream_statuses == fix_committed) | (upstream_statuses == fix_released)
+    downstream_invalid = numpy.in1d(downstream_statuses, invalid_codes)
+    downstream_released = downstream_statuses == fix_released
+    # unity, as used as a metatarget, ignores invalid downstream tasks
+    downstream_pending = has_downstream & ~downstream_released & (~is_unity | ~downstream_invalid)
+
+    develop_upstream = upstream_valid & ~upstream_landed                                         # A
+    land_downstream = upstream_valid & upstream_landed & downstream_pending                      # B
+    downstream_only = ~upstream_valid & has_downstream & ~downstream_invalid
+    develop_downstream = downstream_only & ~downstream_released                                  # C
+    not_closed = (develop_upstream & downstream_pending) | land_downstream | develop_downstream | (upstream_valid & opened)
+
+    def any_by_bug(mask):
+        return numpy.bincount(bug_indexes, weights=mask, minlength=len(triaged_bugs)) > 0
+    ready_to_review = any_by_bug(upstream_valid | downstream_only) & ~any_by_bug(not_closed)     # D
+    added_somewhere = any_by_bug(develop_upstream | land_downstream | develop_downstream) | ready_to_review
+
+    ready_to_develop_upstream = {}
+    ready_to_develop_downstream = {}
+    ready_to_land_downstream = {}
+    for (mask, bugs, task_bugs) in ((develop_upstream, ready_to_develop_upstream, upstream_bugs),
+                                    (develop_downstream, ready_to_develop_downstream, downstream_bugs),
+                                    (land_downstream, ready_to_land_downstream, downstream_bugs)):
+        for row in numpy.flatnonzero(mask):
+            bugs.setdefault(projects[row], set()).add(task_bugs[row])
+
+    return (ready_to_develop_upstream, ready_to_develop_downstream, ready_to_land_downstream,
+            numpy.flatnonzero(ready_to_review).tolist(), numpy.flatnonzero(~added_somewhere).tolist())
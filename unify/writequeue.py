@@ -0,0 +1,139 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (C) 2011 Didier Roche <didrocks@ubuntu.com>
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import lazr.restfulclient.errors
+import logging
+import socket
+import threading
+import time
+
+from unify import launchpadmanager
+from unify.metrics import get_metrics, timed
+from unify.threadpool import parallel_map
+
+class PendingWrite():
+    """ changes to save on a launchpad entry """
+
+    def __init__(self, self_link, changes, on_applied=None):
+        self.self_link = self_link
+        self.changes = changes
+        self.on_applied = on_applied
+
+
+class WriteQueue():
+    """ launchpad writes collected during a run and applied in bulk
+
+    All changes to the same entry are merged into a single save. Writes are
+    done by a pool of workers. Server errors are retried with an exponential
+    backoff and precondition failures (entry changed since we read it) are
+    retried on a freshly loaded entry."""
+
+    def __init__(self, workers=4, max_retries=5, backoff=1):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pending = collections.OrderedDict()
+        self.coalesced = 0
+        self.applied = 0
+        self.retried = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def set(self, entry, **changes):
+        """ change some fields of entry (a TaskRecord or a launchpad entry) and queue the save """
+        for field in changes:
+            setattr(entry, field, changes[field])
+        if entry.self_link in self.pending:
+            # already something to save there (like status then importance), only one PATCH for both
+            self.pending[entry.self_link].changes.update(changes)
+            self._count('coalesced')
+            return
+        on_applied = None
+        store = getattr(entry, 'store', None)
+        if store:
+            on_applied = lambda: store.save_task(entry)
+        self.pending[entry.self_link] = PendingWrite(entry.self_link, changes, on_applied)
+
+    @timed('writes')
+    def flush(self):
+        """ apply all pending writes, return a dict of self_link: True if the write was applied """
+        pending = self.pending.values()
+        self.pending = collections.OrderedDict()
+        results = parallel_map(self._apply, pending, self.workers)
+        # callbacks touch the mirror, which only lives in the main thread
+        for (write, applied) in zip(pending, results):
+            if applied and write.on_applied:
+                write.on_applied()
+        return dict((write.self_link, applied) for (write, applied) in zip(pending, results))
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        get_metrics().count_write(counter)
+
+    def _apply(self, write):
+        """ save one write, retrying what can be retried """
+        client = launchpadmanager.borrowLaunchpad()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    entry = client.load(write.self_link)
+                    for field in write.changes:
+                        value = write.changes[field]
+                        # entries (like milestones) are bound to the client which loaded them
+                        if hasattr(value, 'self_link'):
+                            value = client.load(value.self_link)
+                        setattr(entry, field, value)
+                    entry.lp_save()
+                    self._count('applied')
+                    return True
+                except lazr.restfulclient.errors.PreconditionFailed:
+                    # someone else changed it meanwhile: reread and reapply right away
+                    delay = 0
+                except (lazr.restfulclient.errors.ServerError, socket.error), e:
+                    delay = self.backoff * pow(2, attempt)
+                except lazr.restfulclient.errors.HTTPError, e:
+                    logging.warning("Can't save %s: %s" % (write.self_link, e))
+                    self._count('failed')
+                    return False
+                attempt += 1
+                if attempt > self.max_retries:
+                    logging.warning("Giving up saving %s after %s attempts" % (write.self_link, attempt))
+                    self._count('failed')
+                    return False
+                self._count('retried')
+                time.sleep(delay)
+        finally:
+            launchpadmanager.returnLaunchpad(client)
+
+    def report(self):
+        """ log what happened to the writes """
+        logging.info("Launchpad writes: %s applied, %s retried, %s failed (%s changes merged into other writes)" % (self.applied, self.retried, self.failed, self.coalesced))
+
+
+# singleton
+write_queue = None
+def get_write_queue(workers=None):
+    global write_queue
+    if not write_queue:
+        write_queue = WriteQueue()
+    if workers:
+        write_queue.workers = workers
+    return write_queue
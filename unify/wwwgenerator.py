@@ -15,12 +15,45 @@
 ### END LICENSE
 
 from __future__ import absolute_import, unicode_literals
+import io
 import os
 import random
 import time
 from extra import cairoplot
+from unify.metrics import get_metrics, timed
 
 importance_order = ('Critical', 'High', 'Medium', 'Low', 'Wishlist', 'Undecided')
+# size of the write buffer of a page
+page_buffer_size = 64 * 1024
+
+class Page():
+    '''A page written on disk while it's generated, between the site header and footer
+
+    The page is written next to its final path and only replaces it once complete.'''
+
+    def __init__(self, generator, pagename):
+        self.generator = generator
+        self.path = os.path.join(generator.webpath, '%s.html' % pagename)
+
+    def __enter__(self):
+        self.f = io.open(self.path + '.new', 'wb', buffering=page_buffer_size)
+        self.f.write(self.generator.header)
+        return self
+
+    def write(self, content):
+        self.f.write(content.encode('utf-8'))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.f.close()
+            os.remove(self.path + '.new')
+            return
+        self.f.write(self.generator.footer)
+        self.f.write(b"    <p>Last updated: %s</p>\n" % self.generator.generated_date)
+        self.f.write(b"   </div>\n </footer>\n</body>\n</html>")
+        self.f.close()
+        os.rename(self.path + '.new', self.path)
+
 
 class WWWGenerator():
 
@@ -33,16 +66,11 @@ class WWWGenerator():
             self.footer = f.read()
         self.generated_date = time.strftime('%A %B %d %Y %H:%M:%S %z')
         
-    def write_page_on_disk(self, pagename, content):
-        '''Write the actual page on disk'''
-        
-        with open(os.path.join(self.webpath, '%s.html' % pagename), 'w') as f:
-            f.write(self.header)
-            f.write(content.encode('utf-8'))
-            f.write(self.footer)
-            f.write("    <p>Last updated: %s</p>\n" % self.generated_date)
-            f.write("   </div>\n </footer>\n</body>\n</html>")
+    def open_page(self, pagename):
+        '''Page to write the content of pagename to, as a context manager'''
+        return Page(self, pagename)
         
+    @timed('page_render')
     def generate_pages_workpages(self, untriaged_bugs, officially_signed_off, design_on_hold, ready_to_develop_upstream,
                                  ready_to_develop_downstream, ready_to_land_downstream,
                                  ready_to_review, invalid_bugs, closed_reports_by_release,
@@ -64,83 +92,80 @@ class WWWGenerator():
                              invalid_bugs):
         '''Generate the design page'''
         
-        main_content = "  <h1>Design View</h1>\n"
-        comment = "Design changes that landed in Ubuntu and ready for the design team to review"
-        main_content += self.generate_subsection("Design changes ready to review", comment, ready_to_review)
-        comment = "Design changes are officially signed off, but that didn't get handed over upstream or downstream"
-        main_content += self.generate_subsection("Triaged and in progress design bugs", comment, officially_signed_off)
-        comment = "Design changes that are on hold (Opinion, Incomplete)"
-        main_content += self.generate_subsection("Design changes on hold", comment, design_on_hold)
-        comment = "Bugs that are not triaged and have an ayatana-design task"
-        main_content += self.generate_subsection("Untriaged design bugs", comment, untriaged_bugs, hidden=True)
-        comment = "Design bugs that are in a inconsistent state"
-        main_content += self.generate_subsection("Inconsistent design bugs", comment, invalid_bugs, hidden=True)
-        main_content += self.generate_summary(
-            [("Design changes ready to develop upstream", ready_to_develop_upstream),
-             ("Design changes ready to develop downstream", ready_to_develop_downstream),
-             ("Design changes ready to land in Ubuntu", ready_to_land_downstream)])
-        self.write_page_on_disk("designer", main_content)
+        with self.open_page("designer") as page:
+            page.write("  <h1>Design View</h1>\n")
+            comment = "Design changes that landed in Ubuntu and ready for the design team to review"
+            self.generate_subsection(page, "Design changes ready to review", comment, ready_to_review)
+            comment = "Design changes are officially signed off, but that didn't get handed over upstream or downstream"
+            self.generate_subsection(page, "Triaged and in progress design bugs", comment, officially_signed_off)
+            comment = "Design changes that are on hold (Opinion, Incomplete)"
+            self.generate_subsection(page, "Design changes on hold", comment, design_on_hold)
+            comment = "Bugs that are not triaged and have an ayatana-design task"
+            self.generate_subsection(page, "Untriaged design bugs", comment, untriaged_bugs, hidden=True)
+            comment = "Design bugs that are in a inconsistent state"
+            self.generate_subsection(page, "Inconsistent design bugs", comment, invalid_bugs, hidden=True)
+            self.generate_summary(page,
+                [("Design changes ready to develop upstream", ready_to_develop_upstream),
+                 ("Design changes ready to develop downstream", ready_to_develop_downstream),
+                 ("Design changes ready to land in Ubuntu", ready_to_land_downstream)])
         
     def generate_upstream_view(self, officially_signed_off, ready_to_develop_upstream,
                                ready_to_land_downstream, ready_to_review, ready_to_develop_upstream_priority):
         '''Generate the upstream page'''
-        main_content = "  <h1>Upstream View</h1>\n"
-        main_content += '''<h2>Upstream projects that can be worked on</h2>
+        with self.open_page("upstream") as page:
+            page.write("  <h1>Upstream View</h1>\n")
+            page.write('''<h2>Upstream projects that can be worked on</h2>
     <div class="collapsable" id="div_upstream_work">
-'''
-        subsection_title = "Design changes ready for upstream work on %s"
-        main_content += self.generate_subsections_by_project(ready_to_develop_upstream, subsection_title)
-        main_content += '''    </div>
+''')
+            subsection_title = "Design changes ready for upstream work on %s"
+            self.generate_subsections_by_project(page, ready_to_develop_upstream, subsection_title)
+            page.write('''    </div>
     <h2>Distro priorities</h2>
     <div class="collapsable" id="div_distro_priority">
-'''
-        subsection_title = "Distro priority for %s"
-        main_content += self.generate_subsections_by_project(ready_to_develop_upstream_priority, subsection_title)
-        main_content += "    </div>\n"
-        # TODO: check why ready_to_review is 18 as land downstream and 6 on the other slide
-        main_content += self.generate_summary(
-            [("Design changes ready to review by the design team", ready_to_review),
-             ("Design changes ready to land in Ubuntu", ready_to_land_downstream)])
-        self.write_page_on_disk("upstream", main_content)
+''')
+            subsection_title = "Distro priority for %s"
+            self.generate_subsections_by_project(page, ready_to_develop_upstream_priority, subsection_title)
+            page.write("    </div>\n")
+            # TODO: check why ready_to_review is 18 as land downstream and 6 on the other slide
+            self.generate_summary(page,
+                [("Design changes ready to review by the design team", ready_to_review),
+                 ("Design changes ready to land in Ubuntu", ready_to_land_downstream)])
 
     def generate_downstream_view(self, ready_to_develop_upstream, ready_to_develop_downstream,
                                  ready_to_land_downstream, ready_to_review, ready_to_develop_downstream_priority, inconsistent_distro_priorities, ready_to_land_downstream_priority, ready_to_review_priority):
         '''Generate the downstream page'''
-        main_content = "  <h1>Downstream View</h1>\n"
-        main_content += '''<h2>Downstream projects that can be worked on</h2>
+        with self.open_page("downstream") as page:
+            page.write("  <h1>Downstream View</h1>\n")
+            page.write('''<h2>Downstream projects that can be worked on</h2>
     <div class="collapsable" id="div_downstream_work">
-'''
-        subsection_title = "Design changes ready for downstream work on %s"
-        main_content += self.generate_subsections_by_project(ready_to_develop_downstream, subsection_title)
-        main_content += '''    </div>
+''')
+            subsection_title = "Design changes ready for downstream work on %s"
+            self.generate_subsections_by_project(page, ready_to_develop_downstream, subsection_title)
+            page.write('''    </div>
     <h2>Upstream changes that are ready to land in distro</h2>
     <div class="collapsable" id="div_downstream_land">
-'''
-        subsection_title = "Design changes ready to land on %s"
-        main_content += self.generate_subsections_by_project(ready_to_land_downstream, subsection_title)
-        main_content += '''    </div>
+''')
+            subsection_title = "Design changes ready to land on %s"
+            self.generate_subsections_by_project(page, ready_to_land_downstream, subsection_title)
+            page.write('''    </div>
     <h2>Upstream distro priority changes ready to land in distro</h2>
     <div class="collapsable" id="div_downstream_priority_land">
-'''
-        subsection_title = "Upstream distro priority ready to land on %s"
-        main_content += self.generate_subsections_by_project(ready_to_land_downstream_priority, subsection_title)
-        main_content += '''    </div>\n'''
-        comment = "Upstream distro priority change ready for review"
-        main_content += self.generate_subsection("Upstream distro priority ready for review", comment, ready_to_review_priority)
-        comment = "Distro priority bugs that are in a inconsistent state"
-        main_content += self.generate_subsection("Inconsistent distro priority bugs", comment, inconsistent_distro_priorities, hidden=True)
-        main_content += self.generate_summary(
-            [("Design changes that are ready for upstream to work on", ready_to_develop_upstream),
-             ("Design changes that landed and waiting for design review", ready_to_review)])
-        self.write_page_on_disk("downstream", main_content)
+''')
+            subsection_title = "Upstream distro priority ready to land on %s"
+            self.generate_subsections_by_project(page, ready_to_land_downstream_priority, subsection_title)
+            page.write('''    </div>\n''')
+            comment = "Upstream distro priority change ready for review"
+            self.generate_subsection(page, "Upstream distro priority ready for review", comment, ready_to_review_priority)
+            comment = "Distro priority bugs that are in a inconsistent state"
+            self.generate_subsection(page, "Inconsistent distro priority bugs", comment, inconsistent_distro_priorities, hidden=True)
+            self.generate_summary(page,
+                [("Design changes that are ready for upstream to work on", ready_to_develop_upstream),
+                 ("Design changes that landed and waiting for design review", ready_to_review)])
        
        
     def generate_stats(self, reviewed_bugs):
         '''Generate the statistic page'''
         
-        main_content = "  <h1>Statistics on design changes</h1>\n"
-        main_content += "    <h2>Number of closed and reviewed design changes per release</h2>\n"
-        
         # generate the graph
         data = []
         x_labels = []
@@ -161,26 +186,27 @@ class WWWGenerator():
             y_labels.append(str(i))
             i += increment
         colors = [(1,0.2,0), (1,0.7,0), (1,1,0), (0,1,0)]
-        cairoplot.bar_plot (os.path.join(self.webpath, 'reviewed_design.svg'), data, 500, 300, border = 20, grid = True, rounded_corners = False, colors = colors, h_labels=x_labels, v_labels=y_labels, max_value=max_graph_value)
-        main_content += '    <img src="reviewed_design.svg" alt="Number of bugs closed by release" />'
-        self.write_page_on_disk("stats", main_content)
+        with get_metrics().phase('chart_render'):
+            cairoplot.bar_plot (os.path.join(self.webpath, 'reviewed_design.svg'), data, 500, 300, border = 20, grid = True, rounded_corners = False, colors = colors, h_labels=x_labels, v_labels=y_labels, max_value=max_graph_value)
+        with self.open_page("stats") as page:
+            page.write("  <h1>Statistics on design changes</h1>\n")
+            page.write("    <h2>Number of closed and reviewed design changes per release</h2>\n")
+            page.write('    <img src="reviewed_design.svg" alt="Number of bugs closed by release" />')
        
-    def generate_subsections_by_project(self, bugs, subsection_title):
+    def generate_subsections_by_project(self, page, bugs, subsection_title):
         '''Generate all subsections for this bugs'''
         
-        content = ""
         for project in bugs:
             comment = subsection_title % project
-            content +=  self.generate_subsection(project, comment, bugs[project], use_h3=True)
-        return content
+            self.generate_subsection(page, project, comment, bugs[project], use_h3=True)
 
-    def generate_subsection(self, section_title, comment, bugs, hidden=False, use_h3=False):
-        '''Generate a subsection tabular of bugs'''
+    def generate_subsection(self, page, section_title, comment, bugs, hidden=False, use_h3=False):
+        '''Generate a subsection tabular of bugs, row by row'''
         
         id_template = section_title.lower().replace(' ', '_') + str(random.randint(0,1000))
         classname = hidden and "hiddencollapsable" or "collapsable"
         hbalise = use_h3 and "h3" or "h2"
-        content = """    <%(header)s>%(section)s (%(number)s)</%(header)s>
+        page.write("""    <%(header)s>%(section)s (%(number)s)</%(header)s>
     <p style="font-size: x-small;">%(comment)s</p>
     <div class="%(class_name)s", id="%(div_id)s">
       <table class=sortable id="%(table_id)s">
@@ -193,7 +219,7 @@ class WWWGenerator():
         </thead>
         <tbody>
 """ % {'header': hbalise, 'section': section_title, 'number': len(bugs), 'comment': comment,
-       'class_name': classname, 'div_id': "div_%s" % id_template, 'table_id': "table_%s" % id_template}
+       'class_name': classname, 'div_id': "div_%s" % id_template, 'table_id': "table_%s" % id_template})
         
         # triage by importance
         sorted_bugs = {}
@@ -212,20 +238,19 @@ class WWWGenerator():
         
         for importance in importance_order:
             for bug in sorted_bugs[importance]:
-                content += """          <tr>
+                page.write("""          <tr>
             <td><a href="%(link)s">%(bug_title)s</a></d>
             <td class="priority_%(importance)s">%(importance)s</td>
             <td>%(assignee)s</td>
           </tr>
-""" % {'bug_title': bug[0], 'link': bug[1], 'importance': importance, 'assignee': bug[2]}
+""" % {'bug_title': bug[0], 'link': bug[1], 'importance': importance, 'assignee': bug[2]})
 
-        content += "        </tbody>\n      </table>\n    </div>\n\n"
-        return content
+        page.write("        </tbody>\n      </table>\n    </div>\n\n")
         
-    def generate_summary (self, bugs_section):
+    def generate_summary (self, page, bugs_section):
         '''Generate the design summary by section'''
         
-        main_content = """    <h2>Other status</h2>
+        page.write("""    <h2>Other status</h2>
     <p style="font-size: x-small;">Miscellanous other status summary. Go to the other pages for details.</p>
     <table>
       <thead>
@@ -235,7 +260,7 @@ class WWWGenerator():
         </tr>
       </thead>
       <tbody>
-"""
+""")
     
         for bug in bugs_section:
             category = bug[0]
@@ -247,12 +272,10 @@ class WWWGenerator():
                     # categories are not set
                     number = len(bug[1])
                     break
-            main_content += """        <tr class="status-postponed">
+            page.write("""        <tr class="status-postponed">
           <td>%s</td>
           <td>%s</td>
         </tr>
-""" % (category, number)
-        main_content += "    </table>\n"
-
-        return main_content
+""" % (category, number))
+        page.write("    </table>\n")
         